@@ -2,11 +2,164 @@
 This class is responsible for storing all information about current game state of a Chess game. It will also be
 responsible for determining the valid moves at the current state and also keep the move log.
 """
-import copy
+from collections import OrderedDict
+
+from Chess.zobrist import PIECE_KEYS, SIDE_KEY, CASTLE_KEYS, ENPASSANT_KEYS, compute_key
+from Chess.evaluation import MG_TABLE, EG_TABLE, PHASE, compute_scores
+
+# Castling rights are kept as a bitmask so they fit in a move's undo record
+WHITE_KINGSIDE = 1
+WHITE_QUEENSIDE = 2
+BLACK_KINGSIDE = 4
+BLACK_QUEENSIDE = 8
+ALL_CASTLE_RIGHTS = WHITE_KINGSIDE | WHITE_QUEENSIDE | BLACK_KINGSIDE | BLACK_QUEENSIDE
+FEN_CASTLE_RIGHTS = {'K': WHITE_KINGSIDE, 'Q': WHITE_QUEENSIDE, 'k': BLACK_KINGSIDE, 'q': BLACK_QUEENSIDE}
+
+# Rights that survive a move touching a square (king and rook home squares clear their rights)
+CASTLE_RIGHTS_MASK = [[ALL_CASTLE_RIGHTS] * 8 for _ in range(8)]
+CASTLE_RIGHTS_MASK[7][4] &= ~(WHITE_KINGSIDE | WHITE_QUEENSIDE)
+CASTLE_RIGHTS_MASK[7][7] &= ~WHITE_KINGSIDE
+CASTLE_RIGHTS_MASK[7][0] &= ~WHITE_QUEENSIDE
+CASTLE_RIGHTS_MASK[0][4] &= ~(BLACK_KINGSIDE | BLACK_QUEENSIDE)
+CASTLE_RIGHTS_MASK[0][7] &= ~BLACK_KINGSIDE
+CASTLE_RIGHTS_MASK[0][0] &= ~BLACK_QUEENSIDE
+
+# Compact board: a 10x12 mailbox of small int piece codes. The two sentinel rows above and below the board and the
+# sentinel column on each side hold OFFBOARD, so sliding and leaping never need a bounds check.
+EMPTY = 0
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = 1, 2, 3, 4, 5, 6
+WHITE = 8
+BLACK = 16
+OFFBOARD = 32
+PIECE_TYPE_MASK = 7
+
+PIECE_CODES = {'--': EMPTY}
+for _colour, _colour_code in (('w', WHITE), ('b', BLACK)):
+    for _letter, _piece_type in (('P', PAWN), ('N', KNIGHT), ('B', BISHOP), ('R', ROOK), ('Q', QUEEN), ('K', KING)):
+        PIECE_CODES[_colour + _letter] = _colour_code | _piece_type
+PIECE_NAMES = [None] * (OFFBOARD + 1)  # piece code -> "wP" style string
+for _name, _code in PIECE_CODES.items():
+    PIECE_NAMES[_code] = _name
+
+MAILBOX_SIZE = 120
+RC_TO_SQUARE = [[21 + 10 * r + c for c in range(8)] for r in range(8)]  # (row, col) -> mailbox index
+SQUARE_TO_RC = [None] * MAILBOX_SIZE  # mailbox index -> (row, col), None on the border
+for _r in range(8):
+    for _c in range(8):
+        SQUARE_TO_RC[RC_TO_SQUARE[_r][_c]] = (_r, _c)
+BOARD_SQUARES = tuple(RC_TO_SQUARE[r][c] for r in range(8) for c in range(8))
+
+# (mailbox offset, row step, col step); rook directions first, then bishop directions
+KING_DIRECTIONS = ((-10, -1, 0), (-1, 0, -1), (10, 1, 0), (1, 0, 1),
+                   (-11, -1, -1), (-9, -1, 1), (9, 1, -1), (11, 1, 1))
+ROOK_OFFSETS = (-10, -1, 10, 1)
+BISHOP_OFFSETS = (-11, -9, 9, 11)
+QUEEN_OFFSETS = BISHOP_OFFSETS + ROOK_OFFSETS
+KING_OFFSETS = BISHOP_OFFSETS + ROOK_OFFSETS
+KNIGHT_DIRECTIONS = ((-12, -1, -2), (-21, -2, -1), (-19, -2, 1), (-8, -1, 2),
+                     (8, 1, -2), (19, 2, -1), (21, 2, 1), (12, 1, 2))
+KNIGHT_OFFSETS = tuple(d[0] for d in KNIGHT_DIRECTIONS)
+
+# A move is packed into one int: bits 0-5 start square and 6-11 end square (row * 8 + col), 12-14 promotion piece
+# type, 15 en passant flag, 16 castling flag, 17-21 moved piece code, 22-26 captured piece code. The low 15 bits are
+# its moveID.
+TO_SHIFT = 6
+PROMOTION_SHIFT = 12
+ENPASSANT_FLAG = 1 << 15
+CASTLE_FLAG = 1 << 16
+MOVED_SHIFT = 17
+CAPTURED_SHIFT = 22
+MOVE_ID_MASK = (1 << 15) - 1
+FROM_CODES = [0] * MAILBOX_SIZE  # mailbox index -> start square bits
+TO_CODES = [0] * MAILBOX_SIZE  # mailbox index -> end square bits
+for _index, _sq in enumerate(BOARD_SQUARES):
+    FROM_CODES[_sq] = _index
+    TO_CODES[_sq] = _index << TO_SHIFT
+PROMOTION_LETTERS = {KNIGHT: 'N', BISHOP: 'B', ROOK: 'R', QUEEN: 'Q'}
+PROMOTION_TYPES = {letter: piece_type for piece_type, letter in PROMOTION_LETTERS.items()}
+PROMOTION_BITS = tuple(piece_type << PROMOTION_SHIFT for piece_type in (QUEEN, KNIGHT, ROOK, BISHOP))
+
+# (right, king square, king target, rook square, squares that must be empty, squares the king passes through) as
+# mailbox indices. The king's own square is covered by not being in check
+CASTLES = (
+    (WHITE_KINGSIDE, RC_TO_SQUARE[7][4], RC_TO_SQUARE[7][6], RC_TO_SQUARE[7][7],
+     (RC_TO_SQUARE[7][5], RC_TO_SQUARE[7][6]), (RC_TO_SQUARE[7][5], RC_TO_SQUARE[7][6])),
+    (WHITE_QUEENSIDE, RC_TO_SQUARE[7][4], RC_TO_SQUARE[7][2], RC_TO_SQUARE[7][0],
+     (RC_TO_SQUARE[7][3], RC_TO_SQUARE[7][2], RC_TO_SQUARE[7][1]), (RC_TO_SQUARE[7][3], RC_TO_SQUARE[7][2])),
+    (BLACK_KINGSIDE, RC_TO_SQUARE[0][4], RC_TO_SQUARE[0][6], RC_TO_SQUARE[0][7],
+     (RC_TO_SQUARE[0][5], RC_TO_SQUARE[0][6]), (RC_TO_SQUARE[0][5], RC_TO_SQUARE[0][6])),
+    (BLACK_QUEENSIDE, RC_TO_SQUARE[0][4], RC_TO_SQUARE[0][2], RC_TO_SQUARE[0][0],
+     (RC_TO_SQUARE[0][3], RC_TO_SQUARE[0][2], RC_TO_SQUARE[0][1]), (RC_TO_SQUARE[0][3], RC_TO_SQUARE[0][2])),
+)
+CASTLE_ROOK_MOVES = [None] * MAILBOX_SIZE  # king target of a castling move -> (rook from, rook to)
+for _castle in CASTLES:
+    CASTLE_ROOK_MOVES[_castle[2]] = (_castle[3], (_castle[1] + _castle[2]) // 2)
+WHITE_CASTLE_RIGHTS = WHITE_KINGSIDE | WHITE_QUEENSIDE
+BLACK_CASTLE_RIGHTS = BLACK_KINGSIDE | BLACK_QUEENSIDE
+
+FIFTY_MOVE_PLIES = 100
+
+MOVES = {}  # packed code -> Move; every distinct move is built once and shared
+
+
+def get_move(code):
+    move = MOVES.get(code)
+    if move is None:
+        move = MOVES[code] = Move.from_code(code)
+    return move
+
+
+def new_mailbox(board):
+    mailbox = bytearray([OFFBOARD]) * MAILBOX_SIZE
+    for r in range(8):
+        for c in range(8):
+            mailbox[RC_TO_SQUARE[r][c]] = PIECE_CODES[board[r][c]]
+    return mailbox
+
+
+class MoveCache:
+    '''
+    Legal moves per position keyed by zobrist key, evicting the least recently used position once full. An entry is
+    (isCheck, Checks, Pins, pin_directions, moves), everything get_valid_moves leaves on the GameState
+    '''
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key, entry):
+        self.entries[key] = entry
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
 
 
 class GameState:
-    def __init__(self):
+    direct_evasions = True  # False answers a check by filtering every pseudo-legal move instead
+    debug_zobrist = False  # when True every make/unmake recomputes the key from scratch and asserts it matches
+    debug_evaluation = False  # the same for the incremental evaluation terms
+
+    '''
+    generator selects the move generator behind get_valid_moves: "mailbox" (default, and the faster) or "bitboard"
+    (a cross-check, see Chess.bitboard).
+    move_cache_size > 0 keeps the legal moves of that many recent positions, so revisiting a position (undo/redo,
+    transpositions) skips generation
+    '''
+    def __init__(self, generator="mailbox", move_cache_size=0):
         self.Board = [
             ["bR", "bN", "bB", "bQ", "bK", "bB", "bN", "bR"],
             ["bP", "bP", "bP", "bP", "bP", "bP", "bP", "bP"],
@@ -17,161 +170,617 @@ class GameState:
             ["wP", "wP", "wP", "wP", "wP", "wP", "wP", "wP"],
             ["wR", "wN", "wB", "wQ", "wK", "wB", "wN", "wR"]
         ]
-        self.move_functions = {'P': self.get_pawn_moves, 'R': self.get_rook_moves, 'B': self.get_bishop_moves,
-                               'N': self.get_knight_moves, 'Q': self.get_queen_moves, 'K': self.get_king_moves}
-        self.Redo_Stack = []
+        # Move generation runs on this mailbox; Board is kept in sync as the row/column view used by the GUI
+        self.mailbox = new_mailbox(self.Board)
+        self.type_move_functions = [None, self.get_pawn_moves, self.get_knight_moves, self.get_bishop_moves,
+                                    self.get_rook_moves, self.get_queen_moves, self.get_king_moves]
+        # One (captured piece code, previous enpassant square, previous castle rights, previous zobrist key, previous
+        # halfmove clock, previous midgame score, previous endgame score, previous phase) record per move in Move_Log
         self.Undo_STack = []
         self.White_To_Move = True
-        self.Bin = []
+        self.Bin = []  # undone moves, replayed by redo_move
         self.Move_Log = []
         self.isCheck = False
         self.Pins = []
+        self.pin_directions = {}  # mailbox square of each pinned piece -> pin direction as a mailbox offset
         self.Checks = []
         self.enpassant_move = ()
+        self.castle_rights = ALL_CASTLE_RIGHTS
+        self.halfmove_clock = 0  # plies since the last capture or pawn move
+        self.fullmove_number = 1
+        self.white_king_square = RC_TO_SQUARE[7][4]  # mailbox index of each king, None if it's missing
+        self.black_king_square = RC_TO_SQUARE[0][4]
+        self.bitboard_generator = None
+        self.bitboards = None  # piece code -> bitboard, kept up to date for the bitboard generator only
+        if generator == "bitboard":
+            from Chess.bitboard import BitboardGenerator, mailbox_bitboards
+            self.bitboard_generator = BitboardGenerator()
+            self.bitboards = mailbox_bitboards(self.mailbox)
+        elif generator != "mailbox":
+            raise ValueError("Unknown move generator: " + str(generator))
+        self.zobrist_key = self.compute_zobrist_key()
+        self.repetitions = {self.zobrist_key: 1}  # zobrist key -> times the position has occurred in this game
+        self.piece_counts = self.count_pieces()  # piece code -> number on the board
+        # Evaluation terms from white's side, see Chess.evaluation
+        self.mg_score, self.eg_score, self.phase = compute_scores(self.mailbox)
+        self.checkMate = False  # set by get_valid_moves
+        self.staleMate = False
+        self.move_cache = MoveCache(move_cache_size) if move_cache_size > 0 else None
+
     '''
-    Takes a move as a parameter and executes it (This won't work for castling and enpassant)
+    Replaces the pieces on the board (a list of 8 rows of "wP" style strings) and rebuilds the mailbox
+    '''
+    def set_board(self, board):
+        self.Board = [list(row) for row in board]
+        self.mailbox = new_mailbox(self.Board)
+        self.white_king_square = self.locate(WHITE | KING)
+        self.black_king_square = self.locate(BLACK | KING)
+        self.zobrist_key = self.compute_zobrist_key()
+        self.repetitions = {self.zobrist_key: 1}
+        self.piece_counts = self.count_pieces()
+        self.mg_score, self.eg_score, self.phase = compute_scores(self.mailbox)
+        if self.bitboards is not None:
+            from Chess.bitboard import mailbox_bitboards
+            self.bitboards = mailbox_bitboards(self.mailbox)
+        self.checkMate = False
+        self.staleMate = False
+
+    '''
+    Starts counting and timing this GameState's move generation and make/unmake, see Chess.instrument. Until this is
+    called nothing is wrapped, so uninstrumented GameStates pay nothing
+    '''
+    def instrument(self, timers=True, allocations=False):
+        from Chess.instrument import Instrumentation
+        return Instrumentation(self, timers, allocations)
+
+    def locate(self, piece):
+        sq = self.mailbox.find(piece)
+        return None if sq == -1 else sq
+
+    def count_pieces(self):
+        counts = [0] * (OFFBOARD + 1)
+        for sq in BOARD_SQUARES:
+            counts[self.mailbox[sq]] += 1
+        return counts
+
+    @classmethod
+    def from_fen(cls, fen, generator="mailbox", move_cache_size=0):
+        game_state = cls(generator, move_cache_size)
+        game_state.set_fen(fen)
+        return game_state
+
+    '''
+    Loads a position from FEN (the two clock fields are optional, as in EPD) and clears the move history
+    '''
+    def set_fen(self, fen):
+        fields = fen.split()
+        if len(fields) < 4:
+            raise ValueError("FEN needs at least 4 fields: " + fen)
+        board = []
+        for rank in fields[0].split('/'):
+            row = []
+            for char in rank:
+                if char.isdigit():
+                    row.extend(["--"] * int(char))
+                elif char.upper() in "PNBRQK":
+                    row.append(('w' if char.isupper() else 'b') + char.upper())
+                else:
+                    raise ValueError("Bad piece '" + char + "' in FEN: " + fen)
+            board.append(row)
+        if len(board) != 8 or any(len(row) != 8 for row in board):
+            raise ValueError("FEN piece placement is not 8x8: " + fen)
+        if fields[1] not in ('w', 'b'):
+            raise ValueError("Bad side to move in FEN: " + fen)
+
+        self.White_To_Move = fields[1] == 'w'
+        self.castle_rights = 0
+        for char in fields[2]:
+            if char in FEN_CASTLE_RIGHTS:
+                self.castle_rights |= FEN_CASTLE_RIGHTS[char]
+            elif char != '-':
+                raise ValueError("Bad castling field in FEN: " + fen)
+        self.enpassant_move = ()
+        if fields[3] != '-':
+            if len(fields[3]) != 2 or fields[3][0] not in "abcdefgh" or fields[3][1] not in "36":
+                raise ValueError("Bad en passant field in FEN: " + fen)
+            row, column = Move.Ranks_To_Rows[fields[3][1]], Move.Files_To_Col[fields[3][0]]
+            pawn_row = row + 1 if self.White_To_Move else row - 1
+            capturer = 'wP' if self.White_To_Move else 'bP'
+            beside = [c for c in (column - 1, column + 1) if 0 <= c < 8]
+            # Kept only when a pawn stands ready to take, as apply_move does
+            if 0 <= pawn_row < 8 and any(board[pawn_row][c] == capturer for c in beside):
+                self.enpassant_move = (row, column)
+        self.halfmove_clock = int(fields[4]) if len(fields) > 4 else 0
+        self.fullmove_number = int(fields[5]) if len(fields) > 5 else 1
+        self.Move_Log = []
+        self.Undo_STack = []
+        self.Bin = []
+        self.set_board(board)
+
+    def to_fen(self):
+        ranks = []
+        for row in self.Board:
+            rank = ""
+            empty = 0
+            for piece in row:
+                if piece == "--":
+                    empty += 1
+                    continue
+                if empty:
+                    rank += str(empty)
+                    empty = 0
+                rank += piece[1] if piece[0] == 'w' else piece[1].lower()
+            ranks.append(rank + (str(empty) if empty else ""))
+        castling = "".join(char for char, right in FEN_CASTLE_RIGHTS.items() if self.castle_rights & right) or "-"
+        enpassant = "-"
+        if self.enpassant_move:
+            enpassant = Move.Col_To_Files[self.enpassant_move[1]] + Move.Rows_To_Ranks[self.enpassant_move[0]]
+        return " ".join(("/".join(ranks), 'w' if self.White_To_Move else 'b', castling, enpassant,
+                         str(self.halfmove_clock), str(self.fullmove_number)))
+
+    '''
+    Hash of the pieces, side to move, castling rights and en passant file, built from scratch. zobrist_key holds the
+    same value maintained incrementally; call this again after editing White_To_Move, castle_rights or
+    enpassant_move by hand
+    '''
+    def compute_zobrist_key(self):
+        return compute_key(self.mailbox, self.White_To_Move, self.castle_rights, self.enpassant_move)
+
+    def check_zobrist_key(self):
+        assert self.zobrist_key == self.compute_zobrist_key(), "Incremental zobrist key is out of sync"
+
+    def check_evaluation(self):
+        assert (self.mg_score, self.eg_score, self.phase) == compute_scores(self.mailbox), \
+            "Incremental evaluation is out of sync"
+
+    '''
+    Takes a move as a parameter and executes it, castling and promotion included
     '''
     def make_move(self, move):
-        # This method is used prevent modification of 'previous board pos' if the board is modified
-        self.Undo_STack.append(copy.deepcopy(self.Board))
-        self.Board[move.startRow][move.startColumn] = "--"
-        self.Board[move.endRow][move.endColumn] = move.pieceMoved
-        self.Move_Log.append(move)  # log the moves to undo
-        self.White_To_Move = not self.White_To_Move  # swap players
+        if self.Bin:
+            self.Bin.clear()  # a new move invalidates the redo history
+        self.apply_move(move)
 
-        if move.is_pawn_promotion:
-            self.Board[move.endRow][move.endColumn] = move.pieceMoved[0] + 'Q'
+    '''
+    Executes a move without touching the redo history. Only a small undo record is stored, never a board copy
+    '''
+    def apply_move(self, move):
+        board = self.Board
+        mailbox = self.mailbox
+        key = self.zobrist_key
+        code = move.code
+        start = move.start
+        end = move.end
+        moved = code >> MOVED_SHIFT & 31
+        if code & ENPASSANT_FLAG:
+            captured_sq = RC_TO_SQUARE[move.startRow][move.endColumn]
+            captured = mailbox[captured_sq]
+            board[move.startRow][move.endColumn] = '--'  # Capturing
+            mailbox[captured_sq] = EMPTY
+        else:
+            captured_sq = end
+            captured = code >> CAPTURED_SHIFT & 31
+        mg = self.mg_score
+        eg = self.eg_score
+        self.Undo_STack.append((captured, self.enpassant_move, self.castle_rights, key, self.halfmove_clock,
+                                mg, eg, self.phase))
+        if captured:
+            key ^= PIECE_KEYS[captured][captured_sq]
+            self.piece_counts[captured] -= 1
+            mg -= MG_TABLE[captured][captured_sq]
+            eg -= EG_TABLE[captured][captured_sq]
+            self.phase -= PHASE[captured]
 
-        if move.enpassant_valid:
-            self.Board[move.startRow][move.endColumn] = '--'  # Capturing
+        promotion = code >> PROMOTION_SHIFT & PIECE_TYPE_MASK
+        if promotion:
+            landed = (moved & ~PIECE_TYPE_MASK) | promotion
+            self.piece_counts[moved] -= 1
+            self.piece_counts[landed] += 1
+            self.phase += PHASE[landed]
+        else:
+            landed = moved
+        mg += MG_TABLE[landed][end] - MG_TABLE[moved][start]
+        eg += EG_TABLE[landed][end] - EG_TABLE[moved][start]
+        board[move.startRow][move.startColumn] = "--"
+        board[move.endRow][move.endColumn] = PIECE_NAMES[landed]
+        mailbox[start] = EMPTY
+        mailbox[end] = landed
+        if moved & PIECE_TYPE_MASK == KING:
+            if moved & WHITE:
+                self.white_king_square = end
+            else:
+                self.black_king_square = end
+            if code & CASTLE_FLAG:
+                rook_from, rook_to = CASTLE_ROOK_MOVES[end]
+                rook = mailbox[rook_from]
+                mailbox[rook_from] = EMPTY
+                mailbox[rook_to] = rook
+                board[move.startRow][SQUARE_TO_RC[rook_from][1]] = "--"
+                board[move.startRow][SQUARE_TO_RC[rook_to][1]] = PIECE_NAMES[rook]
+                key ^= PIECE_KEYS[rook][rook_from] ^ PIECE_KEYS[rook][rook_to]
+                mg += MG_TABLE[rook][rook_to] - MG_TABLE[rook][rook_from]
+                eg += EG_TABLE[rook][rook_to] - EG_TABLE[rook][rook_from]
+        self.mg_score = mg
+        self.eg_score = eg
+        if self.bitboards is not None:
+            self.toggle_bitboards(code, start, end, moved, landed, captured, captured_sq)
+        key ^= PIECE_KEYS[moved][start] ^ PIECE_KEYS[landed][end] ^ SIDE_KEY
+        self.Move_Log.append(move)  # log the moves to undo
+        self.White_To_Move = not self.White_To_Move  # swap players
+        if captured or moved & PIECE_TYPE_MASK == PAWN:
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+        if self.White_To_Move:
+            self.fullmove_number += 1
 
-        if move.pieceMoved[1] == 'P' and abs(move.startRow - move.endRow) == 2:
+        if self.enpassant_move:
+            key ^= ENPASSANT_KEYS[self.enpassant_move[1]]
+        # The en passant square is only set (and hashed) when an enemy pawn beside the pushed one could take it;
+        # otherwise the position repeats one reached without the double push and must hash the same
+        if moved & PIECE_TYPE_MASK == PAWN and (end - start == 20 or start - end == 20) and \
+                (mailbox[end - 1] == moved ^ (WHITE | BLACK) or mailbox[end + 1] == moved ^ (WHITE | BLACK)):
             self.enpassant_move = ((move.startRow + move.endRow) // 2, move.startColumn)
+            key ^= ENPASSANT_KEYS[move.startColumn]
         else:
             self.enpassant_move = ()
+        rights = self.castle_rights & CASTLE_RIGHTS_MASK[move.startRow][move.startColumn] & \
+            CASTLE_RIGHTS_MASK[move.endRow][move.endColumn]
+        if rights != self.castle_rights:
+            key ^= CASTLE_KEYS[self.castle_rights] ^ CASTLE_KEYS[rights]
+            self.castle_rights = rights
+        self.zobrist_key = key
+        self.repetitions[key] = self.repetitions.get(key, 0) + 1
+        if self.debug_zobrist:
+            self.check_zobrist_key()
+        if self.debug_evaluation:
+            self.check_evaluation()
+
+    '''
+    Flips the bits a move changes in the bitboards. Flipping is its own inverse, so unmake_move makes the same call
+    '''
+    def toggle_bitboards(self, code, start, end, moved, landed, captured, captured_sq):
+        bitboards = self.bitboards
+        colour = moved & (WHITE | BLACK)
+        start_bit = 1 << FROM_CODES[start]
+        end_bit = 1 << FROM_CODES[end]
+        bitboards[moved] ^= start_bit
+        bitboards[landed] ^= end_bit
+        bitboards[colour] ^= start_bit | end_bit
+        if captured:
+            captured_bit = 1 << FROM_CODES[captured_sq]
+            bitboards[captured] ^= captured_bit
+            bitboards[captured & (WHITE | BLACK)] ^= captured_bit
+        if code & CASTLE_FLAG:
+            rook_from, rook_to = CASTLE_ROOK_MOVES[end]
+            rook_bits = 1 << FROM_CODES[rook_from] | 1 << FROM_CODES[rook_to]
+            bitboards[colour | ROOK] ^= rook_bits
+            bitboards[colour] ^= rook_bits
 
     def undo_move(self):
-        # With this modified function reversing castling and enpassant is possible
         if len(self.Move_Log) != 0:
-            move = self.Move_Log.pop()
-            self.Bin.append(move)
-            self.Redo_Stack.append(copy.deepcopy(self.Board))
-            self.Board = self.Undo_STack.pop()
-            self.White_To_Move = not self.White_To_Move
+            self.Bin.append(self.unmake_move())
 
-            if move.enpassant_valid:
-                self.enpassant_move = (move.endRow, move.endColumn)
+    '''
+    Reverses the last move from its undo record without touching the redo history, and returns it
+    '''
+    def unmake_move(self):
+        move = self.Move_Log.pop()
+        repetitions = self.repetitions
+        count = repetitions[self.zobrist_key] - 1
+        if count:
+            repetitions[self.zobrist_key] = count
+        else:
+            del repetitions[self.zobrist_key]
+        captured, self.enpassant_move, self.castle_rights, self.zobrist_key, self.halfmove_clock, \
+            self.mg_score, self.eg_score, self.phase = self.Undo_STack.pop()
+        board = self.Board
+        mailbox = self.mailbox
+        code = move.code
+        moved = code >> MOVED_SHIFT & 31
+        if self.bitboards is not None:
+            captured_sq = RC_TO_SQUARE[move.startRow][move.endColumn] if code & ENPASSANT_FLAG else move.end
+            self.toggle_bitboards(code, move.start, move.end, moved, mailbox[move.end], captured, captured_sq)
+        if code >> PROMOTION_SHIFT & PIECE_TYPE_MASK:
+            self.piece_counts[mailbox[move.end]] -= 1
+            self.piece_counts[moved] += 1
+        if captured:
+            self.piece_counts[captured] += 1
+        board[move.startRow][move.startColumn] = PIECE_NAMES[moved]  # also reverts a promotion
+        mailbox[move.start] = moved
+        if moved & PIECE_TYPE_MASK == KING:
+            if moved & WHITE:
+                self.white_king_square = move.start
+            else:
+                self.black_king_square = move.start
+            if code & CASTLE_FLAG:
+                rook_from, rook_to = CASTLE_ROOK_MOVES[move.end]
+                rook = mailbox[rook_to]
+                mailbox[rook_to] = EMPTY
+                mailbox[rook_from] = rook
+                board[move.startRow][SQUARE_TO_RC[rook_to][1]] = "--"
+                board[move.startRow][SQUARE_TO_RC[rook_from][1]] = PIECE_NAMES[rook]
+        if code & ENPASSANT_FLAG:
+            board[move.endRow][move.endColumn] = '--'
+            mailbox[move.end] = EMPTY
+            board[move.startRow][move.endColumn] = PIECE_NAMES[captured]
+            mailbox[RC_TO_SQUARE[move.startRow][move.endColumn]] = captured
+        else:
+            board[move.endRow][move.endColumn] = PIECE_NAMES[captured]
+            mailbox[move.end] = captured
+        if self.White_To_Move:
+            self.fullmove_number -= 1
+        self.White_To_Move = not self.White_To_Move
+        if self.debug_zobrist:
+            self.check_zobrist_key()
+        if self.debug_evaluation:
+            self.check_evaluation()
+        return move
 
     def redo_move(self):
-        if self.Redo_Stack:
-            self.Undo_STack.append(copy.deepcopy(self.Board))
-            self.Board = self.Redo_Stack.pop()
-            self.Move_Log.append(self.Bin.pop())
-            self.White_To_Move = not self.White_To_Move
+        if self.Bin:
+            self.apply_move(self.Bin.pop())
 
     '''
     All the moves considering checks 
     '''
     def get_valid_moves(self):
+        cache = self.move_cache
+        if cache is not None:
+            entry = cache.get(self.zobrist_key)
+            if entry is not None:
+                self.isCheck, self.Checks, self.Pins, self.pin_directions, moves = entry
+                self.checkMate = not moves and self.isCheck
+                self.staleMate = not moves and not self.isCheck
+                return list(moves)
+        if self.bitboard_generator is not None:
+            moves = self.bitboard_generator.get_valid_moves(self)
+        else:
+            moves = self.generate_valid_moves()
+        if moves is not False:
+            self.checkMate = not moves and self.isCheck
+            self.staleMate = not moves and not self.isCheck
+            if cache is not None:
+                cache.put(self.zobrist_key, (self.isCheck, self.Checks, self.Pins, self.pin_directions, tuple(moves)))
+        return moves
+
+    '''
+    Draw by the fifty-move rule: a hundred plies without a capture or a pawn move
+    '''
+    def is_fifty_move_draw(self):
+        return self.halfmove_clock >= FIFTY_MOVE_PLIES
+
+    def repetition_count(self):
+        return self.repetitions.get(self.zobrist_key, 0)
+
+    def is_threefold_repetition(self):
+        return self.repetitions.get(self.zobrist_key, 0) >= 3
+
+    '''
+    Neither side can ever mate: bare kings, a single minor piece, or bishops that all stand on one square colour
+    '''
+    def is_insufficient_material(self):
+        counts = self.piece_counts
+        for piece_type in (PAWN, ROOK, QUEEN):
+            if counts[WHITE | piece_type] or counts[BLACK | piece_type]:
+                return False
+        knights = counts[WHITE | KNIGHT] + counts[BLACK | KNIGHT]
+        bishops = counts[WHITE | BISHOP] + counts[BLACK | BISHOP]
+        if knights + bishops <= 1:
+            return True
+        if knights or bishops > 4:
+            return False
+        colours = set()
+        for sq in BOARD_SQUARES:  # at most four bishops to look at
+            if self.mailbox[sq] & PIECE_TYPE_MASK == BISHOP:
+                r, c = SQUARE_TO_RC[sq]
+                colours.add((r + c) % 2)
+        return len(colours) == 1
+
+    def is_draw(self):
+        return self.is_fifty_move_draw() or self.is_threefold_repetition() or self.is_insufficient_material()
+
+    '''
+    Why the game is over, or None while it goes on. Checkmate and stalemate come from the last get_valid_moves call
+    '''
+    def get_game_result(self):
+        if self.checkMate:
+            return "checkmate"
+        if self.staleMate:
+            return "stalemate"
+        if self.is_insufficient_material():
+            return "insufficient material"
+        if self.is_threefold_repetition():
+            return "threefold repetition"
+        if self.is_fifty_move_draw():
+            return "fifty-move rule"
+        return None
+
+    def generate_valid_moves(self):
         moves = []
-        self.isCheck, self.Pins, self.Checks = self.check_for_pins_and_check()
         location = self.find_kings()
         if location is None:
             return False  # No king found, not in check
-        r, c = location
-        if self.White_To_Move:
-            king_row = r
-            king_column = c
-        else:
-            king_row = r
-            king_column = c
+        king_row, king_column = location
+        self.isCheck, self.Pins, self.Checks = self.check_for_pins_and_check()
+        self.pin_directions = {RC_TO_SQUARE[pin[0]][pin[1]]: pin[2] * 10 + pin[3] for pin in self.Pins}
         if self.isCheck:
             if len(self.Checks) == 1:
-                moves = self.get_all_possible_moves()
-                check = self.Checks[0]
-                check_row = check[0]
-                check_col = check[1]
-                piece_checking = self.Board[check_row][check_col]
-                valid_squares = []
-                if piece_checking[1] == 'N':
-                    valid_squares = [(check_row, check_col)]
+                if self.direct_evasions:
+                    moves = self.get_check_evasions(king_row, king_column)
                 else:
-                    for i in range(1, 8):
-                        valid_square = (king_row + check[2] * i, king_column + check[3] * i)
-                        valid_squares.append(valid_square)
-                        if valid_square[0] == check_row and valid_square[1] == check_col:
-                            break
-                for i in range(len(moves) - 1, -1, -1):  # always go backwards when iterating towards list
-                    if moves[i].pieceMoved[1] != 'K':
-                        if not (moves[i].endRow, moves[i].endColumn) in valid_squares:
-                            moves.remove(moves[i])
+                    moves = self.get_filtered_check_evasions(king_row, king_column)
             else:
                 self.get_king_moves(king_row, king_column, moves)
         else:
             moves = self.get_all_possible_moves()
+            self.get_castle_moves(moves)
+
+        return moves
+
+    '''
+    Castling moves for the side to move, which must not be in check. The rights bitmask says the king and rook haven't
+    moved; the squares between must be empty and the king mustn't pass through or land on an attacked square
+    '''
+    def get_castle_moves(self, moves):
+        if self.White_To_Move:
+            rights, friend_colour, enemy_colour = self.castle_rights & WHITE_CASTLE_RIGHTS, WHITE, BLACK
+        else:
+            rights, friend_colour, enemy_colour = self.castle_rights & BLACK_CASTLE_RIGHTS, BLACK, WHITE
+        if not rights:
+            return
+        mailbox = self.mailbox
+        king = friend_colour | KING
+        for right, king_sq, target, rook_sq, between, path in CASTLES:
+            if rights & right and mailbox[king_sq] == king and mailbox[rook_sq] == friend_colour | ROOK and \
+                    all(mailbox[sq] == EMPTY for sq in between) and \
+                    not any(self.square_attacked(sq, enemy_colour) for sq in path):
+                moves.append(get_move(FROM_CODES[king_sq] | TO_CODES[target] | king << MOVED_SHIFT | CASTLE_FLAG))
+
+    '''
+    Squares a non-king move must land on to answer the single check in self.Checks: the checker itself, and for a
+    sliding checker the squares between it and the king
+    '''
+    def get_evasion_squares(self, king_row, king_column):
+        check_row, check_col, d_row, d_col = self.Checks[0]
+        checker = RC_TO_SQUARE[check_row][check_col]
+        if self.mailbox[checker] & PIECE_TYPE_MASK == KNIGHT:
+            return [checker]
+        step = d_row * 10 + d_col
+        squares = []
+        sq = RC_TO_SQUARE[king_row][king_column]
+        while sq != checker:
+            sq += step
+            squares.append(sq)
+        return squares
 
+    '''
+    Answers to a single check generated directly: captures of the checker, interpositions and king moves. Pinned
+    pieces can never answer a check, so they are skipped
+    '''
+    def get_check_evasions(self, king_row, king_column):
+        moves = []
+        targets = self.get_evasion_squares(king_row, king_column)
+        for sq in targets:
+            self.get_moves_to_square(sq, moves)
+
+        if self.enpassant_move:  # en passant can capture the checking pawn or land between king and checker
+            enpassant_sq = RC_TO_SQUARE[self.enpassant_move[0]][self.enpassant_move[1]]
+            forward = -10 if self.White_To_Move else 10
+            captured_sq = enpassant_sq - forward
+            if captured_sq == targets[-1] or enpassant_sq in targets:
+                pawn = (WHITE if self.White_To_Move else BLACK) | PAWN
+                for sq in (captured_sq - 1, captured_sq + 1):
+                    if self.mailbox[sq] == pawn and sq not in self.pin_directions and \
+                            self.enpassant_is_legal(sq, enpassant_sq, captured_sq):
+                        moves.append(get_move(FROM_CODES[sq] | TO_CODES[enpassant_sq] | pawn << MOVED_SHIFT |
+                                              ENPASSANT_FLAG))
+
+        self.get_king_moves(king_row, king_column, moves)
         return moves
 
+    '''
+    The original evasion path: every pseudo-legal move, filtered down to king moves and moves onto an evasion
+    square. Kept to cross-check get_check_evasions (set GameState.direct_evasions = False)
+    '''
+    def get_filtered_check_evasions(self, king_row, king_column):
+        targets = set(self.get_evasion_squares(king_row, king_column))
+        checker = targets and RC_TO_SQUARE[self.Checks[0][0]][self.Checks[0][1]]
+        return [move for move in self.get_all_possible_moves()
+                if move.pieceMoved[1] == 'K' or RC_TO_SQUARE[move.endRow][move.endColumn] in targets or
+                (move.enpassant_valid and RC_TO_SQUARE[move.startRow][move.endColumn] == checker)]
+
+    '''
+    Adds the moves of unpinned, non-king friendly pieces that end on the mailbox square target
+    '''
+    def get_moves_to_square(self, target, moves):
+        mailbox = self.mailbox
+        pins = self.pin_directions
+        end_bits = TO_CODES[target] | mailbox[target] << CAPTURED_SHIFT
+        if self.White_To_Move:
+            friend_colour, forward, double_push_row = WHITE, -10, 4
+        else:
+            friend_colour, forward, double_push_row = BLACK, 10, 3
+
+        knight = friend_colour | KNIGHT
+        for d in KNIGHT_OFFSETS:
+            if mailbox[target + d] == knight and target + d not in pins:
+                moves.append(get_move(FROM_CODES[target + d] | knight << MOVED_SHIFT | end_bits))
+        queen = friend_colour | QUEEN
+        for offsets, slider in ((ROOK_OFFSETS, friend_colour | ROOK), (BISHOP_OFFSETS, friend_colour | BISHOP)):
+            for d in offsets:
+                sq = target + d
+                while mailbox[sq] == EMPTY:
+                    sq += d
+                if (mailbox[sq] == slider or mailbox[sq] == queen) and sq not in pins:
+                    moves.append(get_move(FROM_CODES[sq] | mailbox[sq] << MOVED_SHIFT | end_bits))
+
+        pawn = friend_colour | PAWN
+        pawn_bits = pawn << MOVED_SHIFT | end_bits
+        promotions = PROMOTION_BITS if SQUARE_TO_RC[target][0] in (0, 7) else (0,)
+        if mailbox[target] != EMPTY:  # captures
+            for sq in (target - forward - 1, target - forward + 1):
+                if mailbox[sq] == pawn and sq not in pins:
+                    for promotion in promotions:
+                        moves.append(get_move(FROM_CODES[sq] | pawn_bits | promotion))
+        else:  # pushes
+            sq = target - forward
+            if mailbox[sq] == pawn:
+                if sq not in pins:
+                    for promotion in promotions:
+                        moves.append(get_move(FROM_CODES[sq] | pawn_bits | promotion))
+            elif mailbox[sq] == EMPTY and SQUARE_TO_RC[target][0] == double_push_row and \
+                    mailbox[sq - forward] == pawn and sq - forward not in pins:
+                moves.append(get_move(FROM_CODES[sq - forward] | pawn_bits))
+
     def check_for_pins_and_check(self):
         pins = []
         checks = []
         in_check = False
-        location = self.find_kings()
-        if location is None:
+        start = self.white_king_square if self.White_To_Move else self.black_king_square
+        if start is None:
             return False  # No king found, not in check
-        r, c = location
+        mailbox = self.mailbox
         if self.White_To_Move:
-            enemy_colour = 'b'
-            friend_colour = 'w'
-            start_row = r
-            start_col = c
+            enemy_colour = BLACK
+            friend_colour = WHITE
         else:
-            enemy_colour = 'w'
-            friend_colour = 'b'
-            start_row = r
-            start_col = c
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
-        for j in range(len(directions)):
-            d = directions[j]
+            enemy_colour = WHITE
+            friend_colour = BLACK
+        for j in range(8):
+            d, d_row, d_col = KING_DIRECTIONS[j]
             possible_pin = None
+            end_sq = start
             for i in range(1, 8):
-                end_row = start_row + d[0] * i
-                end_col = start_col + d[1] * i
-                if 0 <= end_row < 8 and 0 <= end_col < 8:
-                    end_piece = self.Board[end_row][end_col]
-                    if end_piece[0] == friend_colour:
+                end_sq += d
+                end_piece = mailbox[end_sq]
+                if end_piece == EMPTY:
+                    continue
+                if end_piece & friend_colour:
+                    if possible_pin is None:
+                        possible_pin = SQUARE_TO_RC[end_sq] + (d_row, d_col)
+                    else:
+                        break
+                elif end_piece & enemy_colour:
+                    piece_type = end_piece & PIECE_TYPE_MASK
+                    if (j <= 3 and piece_type == ROOK) or (j >= 4 and piece_type == BISHOP) or \
+                            (i == 1 and piece_type == PAWN and ((enemy_colour == WHITE and j >= 6) or
+                                                                (enemy_colour == BLACK and 4 <= j <= 5))) or \
+                            (piece_type == QUEEN) or (i == 1 and piece_type == KING):
                         if possible_pin is None:
-                            possible_pin = (end_row, end_col, d[0], d[1])
+                            in_check = True
+                            checks.append(SQUARE_TO_RC[end_sq] + (d_row, d_col))
                         else:
-                            break
-                    elif end_piece[0] == enemy_colour:
-                        piece_type = end_piece[1]
-                        if (0 <= j <= 3 and piece_type == 'R') or \
-                                (4 <= j <= 7 and piece_type == 'B') or \
-                                (i == 1 and piece_type == 'P' and ((enemy_colour == 'w' and 6 <= j <= 7) or
-                                                                   (enemy_colour == 'b' and 4 <= j <= 5))) or \
-                                (piece_type == 'Q') or (i == 1 and piece_type == 'K'):
-                            if possible_pin is None:
-                                in_check = True
-                                checks.append((end_row, end_col, d[0], d[1]))
-                                break
-                            else:
-                                pins.append(possible_pin)
-                                break
-                        else:
-                            break
-                else:
+                            pins.append(possible_pin)
+                    break
+                else:  # off the board
                     break
 
-        knight_direction = ((-1, -2), (-2, -1), (-2, 1), (-1, 2), (1, -2), (2, -1), (2, 1), (1, 2))
-        for m in knight_direction:
-            end_row = start_row + m[0]
-            end_col = start_col + m[1]
-            if 0 <= end_row < 8 and 0 <= end_col < 8:
-                end_piece = self.Board[end_row][end_col]
-                if end_piece[0] == enemy_colour and end_piece[1] == 'N':
-                    in_check = True
-                    checks.append((end_row, end_col, m[0], m[1]))
+        for d, d_row, d_col in KNIGHT_DIRECTIONS:
+            end_sq = start + d
+            if mailbox[end_sq] == enemy_colour | KNIGHT:
+                in_check = True
+                checks.append(SQUARE_TO_RC[end_sq] + (d_row, d_col))
         return in_check, pins, checks
 
     '''
@@ -179,238 +788,288 @@ class GameState:
     '''
     def get_all_possible_moves(self):
         moves = []
-        for r in range(len(self.Board)):  # Number of rows
-            for c in range(len(self.Board[r])):  # number of cols in given row
-                turn = self.Board[r][c][0]
-                if (turn == 'w' and self.White_To_Move) or (turn == 'b' and not self.White_To_Move):
-                    piece = self.Board[r][c][1]
-                    self.move_functions[piece](r, c, moves)
+        mailbox = self.mailbox
+        functions = self.type_move_functions
+        friend_colour = WHITE if self.White_To_Move else BLACK
+        for sq in BOARD_SQUARES:
+            piece = mailbox[sq]
+            if piece & friend_colour:
+                r, c = SQUARE_TO_RC[sq]
+                functions[piece & PIECE_TYPE_MASK](r, c, moves)
         return moves
+
     '''
     This function will get all the pawn moves 
     '''
 
     def get_pawn_moves(self, r, c, moves):
-        piece_pinned = False
-        pin_direction = ()
-        for i in range(len(self.Pins) - 1, -1, -1):
-            if self.Pins[i][0] == r and self.Pins[i][1] == c:
-                piece_pinned = True
-                pin_direction = (self.Pins[i][2], self.Pins[i][3])
-                self.Pins.remove(self.Pins[i])
-                break
-
-        if self.White_To_Move:  # White pawn moves
-            if self.Board[r - 1][c] == '--':  # one square pawn advance
-                if not piece_pinned or pin_direction == (-1, 0):
-                    moves.append(Move((r, c), (r - 1, c), self.Board))
-                    if r == 6 and self.Board[r - 2][c] == '--':  # 2 square pawn advance
-                        moves.append(Move((r, c), (r - 2, c), self.Board))
-
-            if c - 1 >= 0:  # Captures to the left
-                if self.Board[r - 1][c - 1][0] == 'b':  # Capturing an enemy piece
-                    if not piece_pinned or pin_direction == (-1, -1):
-                        moves.append(Move((r, c), (r - 1, c - 1), self.Board))
-                if (r - 1, c - 1) == self.enpassant_move:  # en passant
-                    if not piece_pinned or pin_direction == (-1, -1):
-                        moves.append(Move((r, c), (r - 1, c - 1), self.Board, is_enpassant_move=True))
-
-            if c + 1 <= 7:  # Captures to right
-                if self.Board[r - 1][c + 1][0] == 'b':  # Capturing an enemy piece
-                    if not piece_pinned or pin_direction == (-1, 1):
-                        moves.append(Move((r, c), (r - 1, c + 1), self.Board))
-                if (r - 1, c + 1) == self.enpassant_move:  # en passant
-                    if not piece_pinned or pin_direction == (-1, 1):
-                        moves.append(Move((r, c), (r - 1, c + 1), self.Board, is_enpassant_move=True))
-
-        else:  # Black pawn moves
-            if self.Board[r + 1][c] == '--':  # one square pawn advance
-                if not piece_pinned or pin_direction == (1, 0):
-                    moves.append(Move((r, c), (r + 1, c), self.Board))
-                    if r == 1 and self.Board[r + 2][c] == '--':  # 2 square pawn advance
-                        moves.append(Move((r, c), (r + 2, c), self.Board))
-
-            if c + 1 <= 7:  # Captures to right
-                if self.Board[r + 1][c + 1][0] == 'w':  # Capturing an enemy piece
-                    if not piece_pinned or pin_direction == (1, 1):
-                        moves.append(Move((r, c), (r + 1, c + 1), self.Board))
-                if (r + 1, c + 1) == self.enpassant_move:  # en passant
-                    if not piece_pinned or pin_direction == (1, 1):
-                        moves.append(Move((r, c), (r + 1, c + 1), self.Board, is_enpassant_move=True))
-
-            if c - 1 >= 0:  # Captures to Left
-                if self.Board[r + 1][c - 1][0] == 'w':  # Capturing an enemy piece
-                    if not piece_pinned or pin_direction == (1, -1):
-                        moves.append(Move((r, c), (r + 1, c - 1), self.Board))
-                if (r + 1, c - 1) == self.enpassant_move:  # en passant
-                    if not piece_pinned or pin_direction == (1, -1):
-                        moves.append(Move((r, c), (r + 1, c - 1), self.Board, is_enpassant_move=True))
+        mailbox = self.mailbox
+        start = RC_TO_SQUARE[r][c]
+        pin = self.pin_directions.get(start, 0)
+        if self.White_To_Move:
+            forward, home_row, last_row, enemy_colour = -10, 6, 1, BLACK
+            captures = (-11, -9)  # left, then right
+        else:
+            forward, home_row, last_row, enemy_colour = 10, 1, 6, WHITE
+            captures = (11, 9)  # right, then left
+        base = FROM_CODES[start] | mailbox[start] << MOVED_SHIFT
+        if r == last_row:  # every push or capture promotes, to any of the four pieces
+            for d in (forward,) + captures:
+                if pin and pin != d and not (d == forward and pin == -forward):
+                    continue
+                end_piece = mailbox[start + d]
+                if (end_piece == EMPTY) if d == forward else (end_piece & enemy_colour):
+                    for promotion in PROMOTION_BITS:
+                        moves.append(get_move(base | promotion | TO_CODES[start + d] | end_piece << CAPTURED_SHIFT))
+            return
+
+        if mailbox[start + forward] == EMPTY:  # one square pawn advance
+            if not pin or pin == forward or pin == -forward:  # a pawn pinned on its file still moves along it
+                moves.append(get_move(base | TO_CODES[start + forward]))
+                if r == home_row and mailbox[start + 2 * forward] == EMPTY:  # 2 square pawn advance
+                    moves.append(get_move(base | TO_CODES[start + 2 * forward]))
+
+        enpassant = self.enpassant_move
+        for d in captures:
+            end_sq = start + d
+            if not pin or pin == d:
+                end_piece = mailbox[end_sq]
+                if end_piece & enemy_colour:  # Capturing an enemy piece
+                    moves.append(get_move(base | TO_CODES[end_sq] | end_piece << CAPTURED_SHIFT))
+                elif SQUARE_TO_RC[end_sq] == enpassant and \
+                        self.enpassant_is_legal(start, end_sq, end_sq - forward):  # en passant
+                    moves.append(get_move(base | TO_CODES[end_sq] | ENPASSANT_FLAG))
 
     def get_rook_moves(self, r, c, moves):
-        piece_pinned = False
-        pin_direction = ()
-        for i in range(len(self.Pins) - 1, -1, -1):
-            if self.Pins[i][0] == r and self.Pins[i][1] == c:
-                piece_pinned = True
-                pin_direction = (self.Pins[i][2], self.Pins[i][3])
-                if self.Board[r][c][1] == 'Q':
-                    self.Pins.remove(self.Pins[i])
-                break
-
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1))
-        enemy_color = 'b' if self.White_To_Move else 'w'
-        for d in directions:
-            for i in range(1, 8):
-                end_row = r + d[0] * i
-                end_column = c + d[1] * i
-                if 0 <= end_row < 8 and 0 <= end_column < 8:
-                    if not piece_pinned or pin_direction == d or pin_direction == (-d[0], -d[1]):
-                        end_piece = self.Board[end_row][end_column]
-                        if end_piece == '--':
-                            moves.append(Move((r, c), (end_row, end_column), self.Board))
-                        elif end_piece[0] == enemy_color:
-                            moves.append(Move((r, c), (end_row, end_column), self.Board))
-                            break
-                        else:  # if friendly piece was encountered
-                            break
-                else:  # out of the board case
-                    break
+        pin = self.pin_directions.get(RC_TO_SQUARE[r][c], 0)
+        self.get_sliding_moves(r, c, ROOK_OFFSETS, pin, moves)
 
     def get_bishop_moves(self, r, c, moves):
-        piece_pinned = False
-        pin_direction = ()
-        for i in range(len(self.Pins) - 1, -1, -1):
-            if self.Pins[i][0] == r and self.Pins[i][1] == c:
-                piece_pinned = True
-                pin_direction = (self.Pins[i][2], self.Pins[i][3])
-                if self.Board[r][c][1] == 'Q':
-                    self.Pins.remove(self.Pins[i])
-                break
-        directions = ((-1, -1), (-1, 1), (1, -1), (1, 1))
-        enemy_color = 'b' if self.White_To_Move else 'w'
-        for d in directions:
-            for i in range(1, 8):
-                end_row = r + d[0] * i
-                end_column = c + d[1] * i
-                if 0 <= end_row < 8 and 0 <= end_column < 8:
-                    if not piece_pinned or pin_direction == d or pin_direction == (-d[0], -d[1]):
-                        end_place = self.Board[end_row][end_column]
-                        if end_place == '--':
-                            moves.append(Move((r, c), (end_row, end_column), self.Board))
-                        elif end_place[0] == enemy_color:
-                            moves.append(Move((r, c), (end_row, end_column), self.Board))
-                            break
-                        else:  # if friendly piece was encountered
-                            break
-                else:  # out of the board case
-                    break
-
-    def get_knight_moves(self, r, c, moves):
-        directions = ((-1, -2), (-2, -1), (-2, 1), (-1, 2), (1, -2), (2, -1), (2, 1), (1, 2))
-        enemy_color = 'b' if self.White_To_Move else 'w'
-        for d in directions:
-            end_row = r + d[0]
-            end_column = c + d[1]
-            if 0 <= end_row < 8 and 0 <= end_column < 8:
-                enemy_piece = self.Board[end_row][end_column]
-                if self.Board[end_row][end_column] == '--':
-                    moves.append(Move((r, c), (end_row, end_column), self.Board))
-                elif enemy_piece[0] == enemy_color:
-                    moves.append(Move((r, c), (end_row, end_column), self.Board))
+        pin = self.pin_directions.get(RC_TO_SQUARE[r][c], 0)
+        self.get_sliding_moves(r, c, BISHOP_OFFSETS, pin, moves)
 
     def get_queen_moves(self, r, c, moves):
-        piece_pinned = False
-        pin_direction = ()
-        for i in range(len(self.Pins) - 1, -1, -1):
-            if self.Pins[i][0] == r and self.Pins[i][1] == c:
-                piece_pinned = True
-                pin_direction = (self.Pins[i][2], self.Pins[i][3])
-                if self.Board[r][c][1] == 'Q':
-                    self.Pins.remove(self.Pins[i])
-                break
-        direction = ((-1, -1), (-1, 1), (1, -1), (1, 1), (-1, 0), (0, -1), (1, 0), (0, 1))
-        enemy_color = 'b' if self.White_To_Move else 'w'
-        for d in direction:
-            for i in range(1, 8):
-                end_row = r + d[0] * i
-                end_column = c + d[1] * i
-                if 0 <= end_row < 8 and 0 <= end_column < 8:
-                    if not piece_pinned or pin_direction == d or pin_direction == (-d[0], -d[1]):
-                        end_place = self.Board[end_row][end_column]
-                        if end_place == '--':
-                            moves.append(Move((r, c), (end_row, end_column), self.Board))
-                        elif end_place[0] == enemy_color:
-                            moves.append(Move((r, c), (end_row, end_column), self.Board))
-                            break
-                        else:  # if friendly piece was encountered
-                            break
-                else:  # out of the board case
-                    break
+        pin = self.pin_directions.get(RC_TO_SQUARE[r][c], 0)
+        self.get_sliding_moves(r, c, QUEEN_OFFSETS, pin, moves)
+
+    '''
+    Walks each direction until the sentinel border, a friendly piece or an enemy piece (which is captured)
+    '''
+    def get_sliding_moves(self, r, c, offsets, pin, moves):
+        mailbox = self.mailbox
+        interned = MOVES.get
+        start = RC_TO_SQUARE[r][c]
+        base = FROM_CODES[start] | mailbox[start] << MOVED_SHIFT
+        enemy_colour = BLACK if self.White_To_Move else WHITE
+        for d in offsets:
+            if pin and pin != d and pin != -d:
+                continue
+            end_sq = start + d
+            end_piece = mailbox[end_sq]
+            while end_piece == EMPTY:
+                code = base | TO_CODES[end_sq]
+                moves.append(interned(code) or get_move(code))
+                end_sq += d
+                end_piece = mailbox[end_sq]
+            if end_piece & enemy_colour:
+                code = base | TO_CODES[end_sq] | end_piece << CAPTURED_SHIFT
+                moves.append(interned(code) or get_move(code))
+
+    def get_knight_moves(self, r, c, moves):
+        if RC_TO_SQUARE[r][c] in self.pin_directions:
+            return  # a pinned knight can never stay on the pin line
+        self.get_leaper_moves(r, c, KNIGHT_OFFSETS, moves)
 
+    '''
+    King moves onto squares the enemy doesn't attack. The king is lifted off the board while looking, so a slider
+    checking along a line still covers the square behind the king
+    '''
     def get_king_moves(self, r, c, moves):
-        king_direction = ((-1, -1), (-1, 1), (1, -1), (1, 1), (-1, 0), (0, -1), (1, 0), (0, 1))
-        enemy_color = 'b' if self.White_To_Move else 'w'
-        for i in range(8):
-            end_row = r + king_direction[i][0]
-            end_column = c + king_direction[i][1]
-            if 0 <= end_row < 8 and 0 <= end_column < 8:
-                end_place = self.Board[end_row][end_column]
-                if end_place == '--':
-                    moves.append(Move((r, c), (end_row, end_column), self.Board))
-                elif end_place[0] == enemy_color:
-                    moves.append(Move((r, c), (end_row, end_column), self.Board))
+        mailbox = self.mailbox
+        interned = MOVES.get
+        start = RC_TO_SQUARE[r][c]
+        king = mailbox[start]
+        base = FROM_CODES[start] | king << MOVED_SHIFT
+        enemy_colour = BLACK if king & WHITE else WHITE
+        mailbox[start] = EMPTY
+        for d in KING_OFFSETS:
+            end_piece = mailbox[start + d]
+            if (end_piece == EMPTY or end_piece & enemy_colour) and not self.square_attacked(start + d, enemy_colour):
+                code = base | TO_CODES[start + d] | end_piece << CAPTURED_SHIFT
+                moves.append(interned(code) or get_move(code))
+        mailbox[start] = king
+
+    def get_leaper_moves(self, r, c, offsets, moves):
+        mailbox = self.mailbox
+        interned = MOVES.get
+        start = RC_TO_SQUARE[r][c]
+        base = FROM_CODES[start] | mailbox[start] << MOVED_SHIFT
+        enemy_colour = BLACK if self.White_To_Move else WHITE
+        for d in offsets:
+            end_piece = mailbox[start + d]
+            if end_piece == EMPTY or end_piece & enemy_colour:
+                code = base | TO_CODES[start + d] | end_piece << CAPTURED_SHIFT
+                moves.append(interned(code) or get_move(code))
 
+    '''
+    (row, column) of the side to move's king, or None. Kings are tracked by apply_move/unmake_move, not searched for
+    '''
     def find_kings(self):
-        wk_location = None
-        bk_location = None
+        sq = self.white_king_square if self.White_To_Move else self.black_king_square
+        if sq is None:
+            return None
+        return SQUARE_TO_RC[sq]
 
-        for row in range(len(self.Board)):
-            for col in range(len(self.Board[row])):
-                if self.Board[row][col] == "wK":
-                    wk_location = (row, col)
-                elif self.Board[row][col] == "bK":
-                    bk_location = (row, col)
+    '''
+    Is the mailbox square sq attacked by a piece of enemy_colour? Looks outwards from sq, so it costs a few dozen
+    lookups instead of generating the enemy's moves
+    '''
+    def square_attacked(self, sq, enemy_colour):
+        mailbox = self.mailbox
+        knight = enemy_colour | KNIGHT
+        for d in KNIGHT_OFFSETS:
+            if mailbox[sq + d] == knight:
+                return True
+        king = enemy_colour | KING
+        for d in KING_OFFSETS:
+            if mailbox[sq + d] == king:
+                return True
+        pawn = enemy_colour | PAWN
+        if enemy_colour == WHITE:
+            if mailbox[sq + 9] == pawn or mailbox[sq + 11] == pawn:
+                return True
+        elif mailbox[sq - 9] == pawn or mailbox[sq - 11] == pawn:
+            return True
+        queen = enemy_colour | QUEEN
+        for offsets, slider in ((ROOK_OFFSETS, enemy_colour | ROOK), (BISHOP_OFFSETS, enemy_colour | BISHOP)):
+            for d in offsets:
+                end_sq = sq + d
+                while mailbox[end_sq] == EMPTY:
+                    end_sq += d
+                if mailbox[end_sq] == slider or mailbox[end_sq] == queen:
+                    return True
+        return False
 
-        if self.White_To_Move:
-            return wk_location
-        else:
-            return bk_location
+    '''
+    Is (r, c) attacked by the side that is not to move?
+    '''
+    def is_square_attacked(self, r, c):
+        return self.square_attacked(RC_TO_SQUARE[r][c], BLACK if self.White_To_Move else WHITE)
+
+    '''
+    Is the side to move in check? Doesn't generate moves, so search can ask it at any node
+    '''
+    def in_check(self):
+        sq = self.white_king_square if self.White_To_Move else self.black_king_square
+        return sq is not None and self.square_attacked(sq, BLACK if self.White_To_Move else WHITE)
+
+    '''
+    En passant removes two pawns from one rank at once, which can expose the king to a slider in a way the pin scan
+    doesn't see, so it's checked by playing it out on the mailbox
+    '''
+    def enpassant_is_legal(self, start, end_sq, captured_sq):
+        king_sq = self.white_king_square if self.White_To_Move else self.black_king_square
+        if king_sq is None:
+            return True
+        mailbox = self.mailbox
+        pawn = mailbox[start]
+        captured = mailbox[captured_sq]
+        mailbox[start] = EMPTY
+        mailbox[captured_sq] = EMPTY
+        mailbox[end_sq] = pawn
+        legal = not self.square_attacked(king_sq, BLACK if self.White_To_Move else WHITE)
+        mailbox[end_sq] = EMPTY
+        mailbox[captured_sq] = captured
+        mailbox[start] = pawn
+        return legal
 
 
 class Move:
+    '''
+    A move is a thin view over its packed int code (see MOVED_SHIFT and friends). Moves from the generators are
+    shared instances looked up by code, so equality and hashing are integer comparisons on moveID
+    '''
+    __slots__ = ('code', 'moveID', 'start', 'end', 'startRow', 'startColumn', 'endRow', 'endColumn')
+
     # Maps keys to vals
     Ranks_To_Rows = {"1": 7, "2": 6, "3": 5, "4": 4,
                      "5": 3, "6": 2, "7": 1, "8": 0}
     Rows_To_Ranks = {v: k for k, v in Ranks_To_Rows.items()}
-    Files_To_Col = {"a": 7, "b": 6, "c": 5, "d": 4,
-                    "e": 3, "f": 2, "g": 1, "h": 0}
+    Files_To_Col = {"a": 0, "b": 1, "c": 2, "d": 3,
+                    "e": 4, "f": 5, "g": 6, "h": 7}
     Col_To_Files = {v: k for k, v in Files_To_Col.items()}
 
-    def __init__(self, start_sq, end_sq, board, is_enpassant_move=False):
-        self.startRow = start_sq[0]
-        self.startColumn = start_sq[1]
-        self.endRow = end_sq[0]
-        self.endColumn = end_sq[1]
-        self.pieceMoved = board[self.startRow][self.startColumn]
-        self.pieceCaptured = board[self.endRow][self.endColumn]
-        self.promotion_choice = 'Q'
+    '''
+    promotion is the piece letter a pawn reaching the last rank becomes
+    '''
+    def __init__(self, start_sq, end_sq, board, is_enpassant_move=False, promotion='Q'):
+        start = RC_TO_SQUARE[start_sq[0]][start_sq[1]]
+        end = RC_TO_SQUARE[end_sq[0]][end_sq[1]]
+        moved = PIECE_CODES[board[start_sq[0]][start_sq[1]]]
+        code = FROM_CODES[start] | TO_CODES[end] | moved << MOVED_SHIFT | \
+            PIECE_CODES[board[end_sq[0]][end_sq[1]]] << CAPTURED_SHIFT
         # Pawn promotion
-        self.is_pawn_promotion = False
-        if (self.pieceMoved == 'wP' and self.endRow == 0) or (self.pieceMoved == 'bP' and self.endRow == 7):
-            self.is_pawn_promotion = True
+        if (moved == WHITE | PAWN and end_sq[0] == 0) or (moved == BLACK | PAWN and end_sq[0] == 7):
+            code |= PROMOTION_TYPES[promotion] << PROMOTION_SHIFT
         # en-passant
-        self.enpassant_valid = is_enpassant_move
+        if is_enpassant_move:
+            code |= ENPASSANT_FLAG
+        # castling: the king moves two squares
+        if moved & PIECE_TYPE_MASK == KING and abs(end_sq[1] - start_sq[1]) == 2:
+            code |= CASTLE_FLAG
+        self.set_code(code)
+
+    @classmethod
+    def from_code(cls, code):
+        move = cls.__new__(cls)
+        move.set_code(code)
+        return move
+
+    def set_code(self, code):
+        self.code = code
+        self.moveID = code & MOVE_ID_MASK
+        self.start = BOARD_SQUARES[code & 63]
+        self.end = BOARD_SQUARES[code >> TO_SHIFT & 63]
+        self.startRow, self.startColumn = SQUARE_TO_RC[self.start]
+        self.endRow, self.endColumn = SQUARE_TO_RC[self.end]
+
+    @property
+    def pieceMoved(self):
+        return PIECE_NAMES[self.code >> MOVED_SHIFT & 31]
 
-        self.moveID = self.startRow * 1000 + self.startColumn * 100 + self.endRow * 10 + self.endColumn
-        # print(self.moveID)
+    @property
+    def pieceCaptured(self):
+        return PIECE_NAMES[self.code >> CAPTURED_SHIFT & 31]
+
+    @property
+    def is_pawn_promotion(self):
+        return self.code >> PROMOTION_SHIFT & PIECE_TYPE_MASK != 0
+
+    @property
+    def promotion_choice(self):
+        return PROMOTION_LETTERS.get(self.code >> PROMOTION_SHIFT & PIECE_TYPE_MASK, 'Q')
+
+    @property
+    def enpassant_valid(self):
+        return self.code & ENPASSANT_FLAG != 0
+
+    @property
+    def is_castle_move(self):
+        return self.code & CASTLE_FLAG != 0
 
     def __eq__(self, other):
         if isinstance(other, Move):
             return self.moveID == other.moveID
         return False
 
+    def __hash__(self):
+        return self.moveID
+
     def get_chess_notation(self):
-        return self.get_rank_files(self.startRow, self.startColumn) + self.get_rank_files(self.endRow, self.endColumn)
+        notation = self.get_rank_files(self.startRow, self.startColumn) + self.get_rank_files(self.endRow, self.endColumn)
+        if self.is_pawn_promotion:
+            notation += self.promotion_choice.lower()
+        return notation
 
     def get_rank_files(self, r, c):
         return self.Col_To_Files[c] + self.Rows_To_Ranks[r]
@@ -1,11 +1,22 @@
+import os
+import random
+
 import pygame as p
 from Chess import ChessEngine
+from Chess.ai import SearchWorker
+from Chess.book import open_default_book
+from Chess.tablebase import open_default_tablebases
 
 Width = Height = 640
 Dimension = 8
 SQ_Size = Height // Dimension
+MIN_SQ_SIZE = 32
 MAX_FPS = 60
-IMAGES = {}
+MOVE_CACHE_SIZE = 1024  # positions whose legal moves are kept, so undo/redo doesn't regenerate them
+AI_THINK_TIME = 2.0  # seconds per engine move
+IMAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Chess pieces")
+IMAGES = {}  # piece -> image as loaded from disk
+SCALED_IMAGES = {}  # (piece, square size) -> scaled image
 
 # Enhanced color scheme
 LIGHT_SQUARE = (240, 217, 181)
@@ -14,46 +25,67 @@ HIGHLIGHT_COLOR = (186, 202, 68, 180)
 SELECTED_COLOR = (246, 246, 105, 200)
 VALID_MOVE_COLOR = (100, 100, 100, 120)
 
+PROMOTION_KEYS = {p.K_q: 'Q', p.K_r: 'R', p.K_b: 'B', p.K_n: 'N'}
+PROMOTION_PROMPT = "Promote to: Q, R, B or N  (Esc cancels)"
+
+GAME_RESULT_TEXT = {"stalemate": "Stalemate", "insufficient material": "Draw - no mating material",
+                    "threefold repetition": "Draw by repetition", "fifty-move rule": "Draw - fifty moves"}
+
 
-def load_images():
-    pieces = [
-        "bP", "bR", "bN", "bB", "bQ", "bK", "wP", "wR", "wN", "wB", "wQ", "wK"
-    ]
-    for piece in pieces:
-        IMAGES[piece] = p.transform.scale(
-            p.image.load("Chess pieces/" + piece + ".png"),
-            (SQ_Size, SQ_Size)
-        )
+'''
+Loads a piece image the first time it is drawn at a given size. Files are read once, whatever the working directory,
+and every size the window has had stays cached, so resizing back and forth doesn't touch the disk
+'''
+def piece_image(piece, size):
+    key = (piece, size)
+    image = SCALED_IMAGES.get(key)
+    if image is None:
+        if piece not in IMAGES:
+            IMAGES[piece] = p.image.load(os.path.join(IMAGE_DIR, piece + ".png")).convert_alpha()
+        image = SCALED_IMAGES[key] = p.transform.smoothscale(IMAGES[piece], (size, size))
+    return image
 
 
 def main():
     p.init()
-    screen = p.display.set_mode((Width, Height))
+    screen = p.display.set_mode((Width, Height), p.RESIZABLE)
     p.display.set_caption("Chess")
     clock = p.time.Clock()
 
-    game_state = ChessEngine.GameState()
+    game_state = ChessEngine.GameState(move_cache_size=MOVE_CACHE_SIZE)
     valid_moves = game_state.get_valid_moves()
     move_made = False
-    load_images()
 
+    renderer = BoardRenderer(screen, SQ_Size)
     running = True
     sq_selected = ()
     player_clicks = []
-
-    # Font for notifications
-    p.font.init()
-    font = p.font.SysFont("Arial", 24, bold=True)
+    pending_promotion = None  # (start, end) of a promotion waiting for the player to pick the piece
+    ai_sides = set()  # True for white, False for black
+    ai = SearchWorker(time_limit=AI_THINK_TIME, book=open_default_book(random.Random()),  # varied openings
+                      tablebases=open_default_tablebases())
 
     while running:
         for event in p.event.get():
             if event.type == p.QUIT:
                 running = False
 
-            elif event.type == p.MOUSEBUTTONDOWN:
+            elif event.type == p.VIDEOEXPOSE:
+                renderer.invalidate()
+
+            elif event.type == p.VIDEORESIZE:
+                # Keep the board square, with whole-pixel squares
+                square_size = max(min(event.w, event.h) // Dimension, MIN_SQ_SIZE)
+                screen = p.display.set_mode((square_size * Dimension, square_size * Dimension), p.RESIZABLE)
+                renderer = BoardRenderer(screen, square_size)
+
+            elif event.type == p.MOUSEBUTTONDOWN and game_state.White_To_Move not in ai_sides and \
+                    pending_promotion is None:
                 location = p.mouse.get_pos()
-                col = location[0] // SQ_Size
-                row = location[1] // SQ_Size
+                col = location[0] // renderer.square_size
+                row = location[1] // renderer.square_size
+                if not (0 <= row < Dimension and 0 <= col < Dimension):
+                    continue
 
                 if sq_selected == (row, col):
                     sq_selected = ()
@@ -64,6 +96,10 @@ def main():
 
                 if len(player_clicks) == 2:
                     move = ChessEngine.Move(player_clicks[0], player_clicks[1], game_state.Board)
+                    if move.is_pawn_promotion and move in valid_moves:
+                        pending_promotion = (player_clicks[0], player_clicks[1])  # played once a piece key is hit
+                        player_clicks = []
+                        continue
 
                     for i in range(len(valid_moves)):
                         if move == valid_moves[i]:
@@ -76,107 +112,233 @@ def main():
                     if not move_made:
                         player_clicks = [sq_selected]
 
+            elif event.type == p.KEYDOWN and pending_promotion is not None:
+                if event.key in PROMOTION_KEYS:
+                    move = ChessEngine.Move(pending_promotion[0], pending_promotion[1], game_state.Board,
+                                            promotion=PROMOTION_KEYS[event.key])
+                    for valid_move in valid_moves:
+                        if move == valid_move:
+                            game_state.make_move(valid_move)
+                            move_made = True
+                            break
+                if event.key in PROMOTION_KEYS or event.key == p.K_ESCAPE:
+                    pending_promotion = None
+                    sq_selected = ()
+                    player_clicks = []
+
             elif event.type == p.KEYDOWN:
                 if event.key == p.K_LEFT:
+                    ai.cancel()
                     game_state.undo_move()
                     move_made = True
                 elif event.key == p.K_RIGHT:
+                    ai.cancel()
                     game_state.redo_move()
                     move_made = True
                 elif event.key == p.K_r:
-                    game_state = ChessEngine.GameState()
+                    ai.cancel()
+                    ai_sides = set()
+                    game_state = ChessEngine.GameState(move_cache_size=MOVE_CACHE_SIZE)
                     valid_moves = game_state.get_valid_moves()
                     sq_selected = ()
                     player_clicks = []
                     move_made = False
+                elif event.key == p.K_a:
+                    # Hand the side to move to the engine, or take it back
+                    ai.cancel()
+                    ai_sides ^= {game_state.White_To_Move}
+                    sq_selected = ()
+                    player_clicks = []
+                elif event.key == p.K_SPACE and ai.is_running():
+                    ai.stop(wait=False)  # play the best move found so far
+
+        # The search runs in its own thread; start it on the engine's turn and play its move once it's done
+        if not move_made and game_state.White_To_Move in ai_sides and valid_moves and \
+                game_state.get_game_result() is None:
+            if ai.result is not None:
+                move = ai.best_move(game_state)
+                ai.cancel()
+                if move is not None:
+                    game_state.make_move(move)
+                    move_made = True
+            elif not ai.is_running():
+                ai.start(game_state)
 
         if move_made:
             valid_moves = game_state.get_valid_moves()
             move_made = False
 
-        draw_game_state(screen, game_state, valid_moves, sq_selected, player_clicks)
-
+        status = PROMOTION_PROMPT if pending_promotion is not None else ai_status_text(ai)
+        renderer.draw(game_state, valid_moves, sq_selected, status)
         clock.tick(MAX_FPS)
-        p.display.flip()
-
-
-def draw_game_state(screen, game_state, valid_moves, sq_selected, player_clicks):
-    draw_board(screen)
-    highlight_squares(screen, game_state, valid_moves, sq_selected, player_clicks)
-    draw_pieces(screen, game_state.Board)
-    draw_move_indicator(screen, game_state)
-
-
-def draw_board(screen):
-    colors = [p.Color(LIGHT_SQUARE), p.Color(DARK_SQUARE)]
-    for row in range(Dimension):
-        for column in range(Dimension):
-            color = colors[(row + column) % 2]
-            p.draw.rect(screen, color, p.Rect(column * SQ_Size, row * SQ_Size, SQ_Size, SQ_Size))
-
-    # Add coordinate labels
-    font = p.font.SysFont("Arial", 16)
-    for i in range(Dimension):
-        # File labels (a-h)
-        label = font.render(chr(97 + i), True, DARK_SQUARE if i % 2 == 0 else LIGHT_SQUARE)
-        screen.blit(label, (i * SQ_Size + SQ_Size - 18, Height - 18))
-
-        # Rank labels (1-8)
-        label = font.render(str(8 - i), True, LIGHT_SQUARE if i % 2 == 0 else DARK_SQUARE)
-        screen.blit(label, (5, i * SQ_Size + 5))
-
-
-def highlight_squares(screen, game_state, valid_moves, sq_selected, player_clicks):
-    if sq_selected:
-        row, col = sq_selected
-        if game_state.Board[row][col] != "--":
-            # Highlight selected square
-            s = p.Surface((SQ_Size, SQ_Size))
-            s.set_alpha(SELECTED_COLOR[3])
-            s.fill(SELECTED_COLOR[:3])
-            screen.blit(s, (col * SQ_Size, row * SQ_Size))
-
-            # Highlight valid moves
-            for move in valid_moves:
-                if move.startRow == row and move.startColumn == col:
-                    s = p.Surface((SQ_Size, SQ_Size))
-                    s.set_alpha(VALID_MOVE_COLOR[3])
-                    s.fill(VALID_MOVE_COLOR[:3])
-                    screen.blit(s, (move.endColumn * SQ_Size, move.endRow * SQ_Size))
-
-                    # Draw circle for valid move indication
-                    center = (move.endColumn * SQ_Size + SQ_Size // 2, move.endRow * SQ_Size + SQ_Size // 2)
-                    if game_state.Board[move.endRow][move.endColumn] == "--":
-                        p.draw.circle(screen, (100, 100, 100), center, SQ_Size // 6)
-                    else:
-                        # Draw ring for capture
-                        p.draw.circle(screen, (100, 100, 100), center, SQ_Size // 2, 4)
-
-
-def draw_pieces(screen, board):
-    for row in range(Dimension):
-        for column in range(Dimension):
-            piece = board[row][column]
-            if piece != "--":
-                screen.blit(IMAGES[piece], p.Rect(column * SQ_Size, row * SQ_Size, SQ_Size, SQ_Size))
-
-
-def draw_move_indicator(screen, game_state):
-    font = p.font.SysFont("Arial", 20, bold=True)
-    text = "White to move" if game_state.White_To_Move else "Black to move"
-    color = (255, 255, 255) if game_state.White_To_Move else (50, 50, 50)
-
-    # Create semi-transparent background
-    s = p.Surface((200, 35))
-    s.set_alpha(200)
-    s.fill((50, 50, 50) if game_state.White_To_Move else (240, 240, 240))
-    screen.blit(s, (Width // 2 - 100, 10))
-
-    # Render text
-    text_surface = font.render(text, True, color)
-    text_rect = text_surface.get_rect(center=(Width // 2, 27))
-    screen.blit(text_surface, text_rect)
+
+
+class BoardRenderer:
+    '''
+    Draws only what changed since the last frame. The board with its labels is rendered once into a cached surface,
+    fonts and overlay surfaces are made once, and every square remembers the piece and highlight it was drawn with.
+    A frame redraws the squares whose state differs, repaints the text overlays lying on them and hands just those
+    rects to display.update; when nothing changed it draws nothing at all
+    '''
+    def __init__(self, screen, square_size):
+        self.screen = screen
+        self.square_size = square_size
+        self.size = square_size * Dimension
+        self.fonts = {}
+        self.board_surface = self.render_board()
+        self.overlays = {
+            "selected": self.make_overlay((square_size, square_size), SELECTED_COLOR),
+            "move": self.make_overlay((square_size, square_size), VALID_MOVE_COLOR),
+            "capture": self.make_overlay((square_size, square_size), VALID_MOVE_COLOR),
+        }
+        self.indicator_rect = p.Rect(self.size // 2 - 120, 10, 240, 35)
+        self.status_rect = p.Rect(0, self.size - 30, self.size, 30)
+        self.indicator_backgrounds = {
+            True: self.make_overlay(self.indicator_rect.size, (50, 50, 50, 200)),
+            False: self.make_overlay(self.indicator_rect.size, (240, 240, 240, 200)),
+        }
+        self.status_background = self.make_overlay(self.status_rect.size, (50, 50, 50, 200))
+        self.text_cache = {}
+        self.invalidate()
+
+    '''
+    Forgets what is on screen, so the next frame redraws everything
+    '''
+    def invalidate(self):
+        self.squares = [[None] * Dimension for _ in range(Dimension)]
+        self.indicator = None
+        self.status = None
+
+    def font(self, size, bold=False):
+        key = (size, bold)
+        if key not in self.fonts:
+            self.fonts[key] = p.font.SysFont("Arial", size, bold=bold)
+        return self.fonts[key]
+
+    def text(self, text, size, color, bold=True):
+        key = (text, size, color)
+        surface = self.text_cache.get(key)
+        if surface is None:
+            if len(self.text_cache) > 256:
+                self.text_cache.clear()  # search progress makes new strings all the time
+            surface = self.text_cache[key] = self.font(size, bold).render(text, True, color)
+        return surface
+
+    def make_overlay(self, size, color):
+        s = p.Surface(size)
+        s.set_alpha(color[3])
+        s.fill(color[:3])
+        return s
+
+    def render_board(self):
+        size = self.square_size
+        board = p.Surface((self.size, self.size))
+        colors = [p.Color(LIGHT_SQUARE), p.Color(DARK_SQUARE)]
+        for row in range(Dimension):
+            for column in range(Dimension):
+                color = colors[(row + column) % 2]
+                p.draw.rect(board, color, p.Rect(column * size, row * size, size, size))
+
+        # Add coordinate labels
+        font = self.font(16)
+        for i in range(Dimension):
+            # File labels (a-h)
+            label = font.render(chr(97 + i), True, DARK_SQUARE if i % 2 == 0 else LIGHT_SQUARE)
+            board.blit(label, (i * size + size - 18, self.size - 18))
+
+            # Rank labels (1-8)
+            label = font.render(str(8 - i), True, LIGHT_SQUARE if i % 2 == 0 else DARK_SQUARE)
+            board.blit(label, (5, i * size + 5))
+        return board
+
+    '''
+    Highlight for every marked square: the selected piece and the squares it can move to
+    '''
+    def square_marks(self, game_state, valid_moves, sq_selected):
+        marks = {}
+        if sq_selected:
+            row, col = sq_selected
+            if game_state.Board[row][col] != "--":
+                marks[sq_selected] = "selected"
+                for move in valid_moves:
+                    if move.startRow == row and move.startColumn == col:
+                        empty = game_state.Board[move.endRow][move.endColumn] == "--"
+                        marks[(move.endRow, move.endColumn)] = "move" if empty else "capture"
+        return marks
+
+    def draw(self, game_state, valid_moves, sq_selected, status):
+        marks = self.square_marks(game_state, valid_moves or [], sq_selected)
+        indicator = (game_state.White_To_Move, game_state.get_game_result())
+        size = self.square_size
+        dirty = []
+        for row in range(Dimension):
+            for column in range(Dimension):
+                state = (game_state.Board[row][column], marks.get((row, column)))
+                rect = p.Rect(column * size, row * size, size, size)
+                # A changed overlay has to be painted over clean squares, not over its old self
+                if state != self.squares[row][column] or \
+                        (indicator != self.indicator and rect.colliderect(self.indicator_rect)) or \
+                        (status != self.status and rect.colliderect(self.status_rect)):
+                    self.squares[row][column] = state
+                    self.draw_square(rect, state)
+                    dirty.append(rect)
+        if not dirty:
+            return
+
+        if self.indicator_rect.collidelist(dirty) != -1:
+            self.draw_move_indicator(indicator)
+        if status is not None and self.status_rect.collidelist(dirty) != -1:
+            self.draw_status(status)
+        self.indicator = indicator
+        self.status = status
+        p.display.update(dirty)
+
+    def draw_square(self, rect, state):
+        piece, mark = state
+        self.screen.blit(self.board_surface, rect, rect)
+        if mark is not None:
+            self.screen.blit(self.overlays[mark], rect)
+            if mark != "selected":
+                # Dot for an empty square, ring for a capture
+                color = VALID_MOVE_COLOR[:3]
+                if mark == "move":
+                    p.draw.circle(self.screen, color, rect.center, self.square_size // 6)
+                else:
+                    p.draw.circle(self.screen, color, rect.center, self.square_size // 2, 4)
+        if piece != "--":
+            self.screen.blit(piece_image(piece, self.square_size), rect)
+
+    def draw_move_indicator(self, indicator):
+        white_to_move, result = indicator
+        if result == "checkmate":
+            text = "Checkmate - " + ("Black wins" if white_to_move else "White wins")
+        elif result is not None:
+            text = GAME_RESULT_TEXT[result]
+        else:
+            text = "White to move" if white_to_move else "Black to move"
+        color = (255, 255, 255) if white_to_move else (50, 50, 50)
+        self.screen.blit(self.indicator_backgrounds[white_to_move], self.indicator_rect)
+        text_surface = self.text(text, 20, color)
+        self.screen.blit(text_surface, text_surface.get_rect(center=self.indicator_rect.center))
+
+    def draw_status(self, status):
+        self.screen.blit(self.status_background, self.status_rect)
+        text_surface = self.text(status, 18, (255, 255, 255))
+        self.screen.blit(text_surface, text_surface.get_rect(center=self.status_rect.center))
+
+
+'''
+The engine's progress while it is thinking, or None
+'''
+def ai_status_text(ai):
+    if not ai.is_running():
+        return None
+    progress = ai.progress
+    if progress is None:
+        return "Thinking..."
+    return "Thinking... depth %d  best %s  (%d nodes)" % (
+        progress.depth, progress.best_move.get_chess_notation(), progress.nodes)
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,96 @@
+"""
+Runs a search in a background thread so the caller (the pygame loop, the UCI reader) keeps handling input while the
+engine thinks. The search works on its own copy of the position (with the game's repetition counts), so the caller's
+GameState can be drawn freely:
+
+    worker = SearchWorker(time_limit=2.0)
+    worker.start(game_state)
+    while worker.is_running():
+        ...  # worker.progress is the last completed depth
+    game_state.make_move(worker.best_move(game_state))
+"""
+import threading
+
+from Chess.ChessEngine import GameState
+from Chess.search import Searcher, MAX_DEPTH
+
+
+class SearchWorker:
+    '''
+    on_iteration, if given, is called from the worker thread with a SearchResult after every completed depth, and
+    on_finish with the final result. book, an OpeningBook, is consulted before searching and tablebases, a
+    Tablebases, during it
+    '''
+    def __init__(self, time_limit=None, max_depth=MAX_DEPTH, node_limit=None, on_iteration=None, on_finish=None,
+                 table=None, book=None, tablebases=None):
+        self.time_limit = time_limit
+        self.max_depth = max_depth
+        self.node_limit = node_limit
+        self.on_iteration = on_iteration
+        self.on_finish = on_finish
+        self.searcher = Searcher(table, self.record_iteration, book, tablebases)
+        self.thread = None
+        self.progress = None
+        self.result = None
+
+    def record_iteration(self, result):
+        self.progress = result
+        if self.on_iteration is not None:
+            self.on_iteration(result)
+
+    '''
+    Starts searching a copy of game_state. Any search still running is cancelled first. The limits default to the
+    ones given to the constructor
+    '''
+    def start(self, game_state, time_limit=None, max_depth=None, node_limit=None):
+        self.cancel()
+        position = GameState.from_fen(game_state.to_fen())
+        position.repetitions = dict(game_state.repetitions)  # the game so far, so the search sees repetition draws
+        self.progress = None
+        self.result = None
+        self.thread = threading.Thread(
+            target=self.run,
+            args=(position, time_limit if time_limit is not None else self.time_limit,
+                  max_depth if max_depth is not None else self.max_depth,
+                  node_limit if node_limit is not None else self.node_limit),
+            daemon=True)
+        self.thread.start()
+
+    def run(self, position, time_limit, max_depth, node_limit):
+        result = self.searcher.search(position, max_depth, time_limit, node_limit)
+        self.result = result
+        if self.on_finish is not None:
+            self.on_finish(result)
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    '''
+    Asks the search to finish with what it has; wait=False returns straight away and lets the thread wind down
+    '''
+    def stop(self, wait=True):
+        if self.thread is not None:
+            self.searcher.stop()
+            while wait and self.thread.is_alive():
+                self.thread.join(0.01)
+                self.searcher.stop()  # in case the search only just started and reset the flag
+
+    '''
+    Stops the search and throws its result away
+    '''
+    def cancel(self):
+        self.stop()
+        self.thread = None
+        self.progress = None
+        self.result = None
+
+    '''
+    The finished search's best move as one of game_state's legal moves, or None
+    '''
+    def best_move(self, game_state):
+        if self.result is None or self.result.best_move is None:
+            return None
+        for move in game_state.get_valid_moves() or []:
+            if move == self.result.best_move:
+                return move
+        return None
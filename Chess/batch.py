@@ -0,0 +1,194 @@
+"""
+Batch analysis across processes. Positions travel to the workers as FEN strings in chunks; each worker keeps one
+GameState (and one Searcher) and reloads it with set_fen, so nothing heavier than a string is ever pickled:
+
+    stats = BatchStats()
+    for result in run_batch(fens, task="perft", depth=3, stats=stats):
+        print(result.index, result.value)
+    print(stats.to_dict())
+
+    python -m Chess.batch --epd suite.epd --task search --depth 4 --workers 8
+
+Tasks are "count" (legal moves), "perft" (leaf nodes at depth) and "search" (fixed depth search). Results stream
+back as chunks finish, either in input order or as soon as they are ready. workers=0 runs everything in this process.
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from Chess.ChessEngine import GameState
+from Chess.epd import read_positions
+from Chess.perft import perft
+from Chess.pgn import replay_positions
+from Chess.search import Searcher
+
+TASKS = ("count", "perft", "search")
+
+# Per-process state, built on the first chunk a worker runs
+_worker_state = {}
+
+
+class BatchResult:
+    def __init__(self, index, fen, value, seconds, worker):
+        self.index = index
+        self.fen = fen
+        self.value = value
+        self.seconds = seconds
+        self.worker = worker
+
+    def to_dict(self):
+        return {"index": self.index, "fen": self.fen, "value": self.value, "seconds": round(self.seconds, 6),
+                "worker": self.worker}
+
+
+class BatchStats:
+    '''
+    Totals for a run, plus positions, chunks and busy seconds per worker process id
+    '''
+    def __init__(self):
+        self.positions = 0
+        self.chunks = 0
+        self.workers = {}
+        self.start = time.perf_counter()
+
+    def add_chunk(self, worker, positions, seconds):
+        self.positions += positions
+        self.chunks += 1
+        totals = self.workers.setdefault(worker, {"positions": 0, "chunks": 0, "seconds": 0.0})
+        totals["positions"] += positions
+        totals["chunks"] += 1
+        totals["seconds"] += seconds
+
+    @property
+    def seconds(self):
+        return time.perf_counter() - self.start
+
+    def to_dict(self):
+        seconds = self.seconds
+        return {"positions": self.positions, "chunks": self.chunks, "seconds": round(seconds, 3),
+                "positions_per_second": round(self.positions / seconds, 1) if seconds > 0 else 0.0,
+                "workers": {str(worker): dict(totals, seconds=round(totals["seconds"], 3))
+                            for worker, totals in self.workers.items()}}
+
+
+def _analyse(game_state, task, depth):
+    if task == "count":
+        return len(game_state.get_valid_moves() or [])
+    if task == "perft":
+        return perft(game_state, depth)
+    searcher = _worker_state.get("searcher")
+    if searcher is None:
+        searcher = _worker_state["searcher"] = Searcher()
+    searcher.table.clear()  # results shouldn't depend on which positions a worker saw before
+    result = searcher.search(game_state, max_depth=depth)
+    return {"best_move": result.best_move.get_chess_notation() if result.best_move else None,
+            "score": result.score, "depth": result.depth, "nodes": result.nodes}
+
+
+'''
+Runs one chunk of (index, fen) pairs in a worker. Returns (worker pid, seconds, [(index, fen, value, seconds)])
+'''
+def run_chunk(task, depth, generator, chunk):
+    start = time.perf_counter()
+    game_state = _worker_state.get(generator)
+    if game_state is None:
+        game_state = _worker_state[generator] = GameState(generator)
+    results = []
+    for index, fen in chunk:
+        position_start = time.perf_counter()
+        game_state.set_fen(fen)
+        value = _analyse(game_state, task, depth)
+        results.append((index, fen, value, time.perf_counter() - position_start))
+    return os.getpid(), time.perf_counter() - start, results
+
+
+def chunked(fens, chunk_size):
+    numbered = enumerate(fens)
+    while True:
+        chunk = list(itertools.islice(numbered, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+'''
+Yields a BatchResult for every FEN in fens (any iterable, consumed lazily). At most workers * 4 chunks are in flight,
+so memory stays bounded for huge inputs. ordered=False yields each chunk as soon as it finishes
+'''
+def run_batch(fens, task="count", depth=1, workers=None, chunk_size=64, ordered=True, generator="mailbox",
+              stats=None):
+    if task not in TASKS:
+        raise ValueError("Unknown task: " + str(task))
+    chunks = chunked(fens, chunk_size)
+    if workers == 0:
+        for chunk in chunks:
+            yield from _chunk_results(run_chunk(task, depth, generator, chunk), stats)
+        return
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        window = workers * 4
+        pending = deque()
+        for chunk in itertools.islice(chunks, window):
+            pending.append(executor.submit(run_chunk, task, depth, generator, chunk))
+        while pending:
+            if ordered:
+                done = [pending.popleft()]
+            else:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.remove(future)
+            for future in done:
+                for chunk in itertools.islice(chunks, 1):
+                    pending.append(executor.submit(run_chunk, task, depth, generator, chunk))
+                yield from _chunk_results(future.result(), stats)
+
+
+def _chunk_results(chunk_result, stats):
+    worker, seconds, results = chunk_result
+    if stats is not None:
+        stats.add_chunk(worker, len(results), seconds)
+    for index, fen, value, position_seconds in results:
+        yield BatchResult(index, fen, value, position_seconds, worker)
+
+
+'''
+FEN of every position reached in a PGN archive, for feeding whole games to run_batch
+'''
+def game_positions(source, generator="mailbox"):
+    for record in replay_positions(source, generator):
+        yield record.game_state.to_fen()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyse many positions on all cores")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--epd", help="EPD/FEN file, one position per line")
+    source.add_argument("--pgn", help="PGN archive; every position of every game is analysed")
+    parser.add_argument("--task", default="count", choices=TASKS)
+    parser.add_argument("--depth", type=int, default=1)
+    parser.add_argument("--workers", type=int, help="processes to use (default: all cores, 0: run in-process)")
+    parser.add_argument("--chunk-size", type=int, default=64)
+    parser.add_argument("--unordered", action="store_true", help="print results as soon as their chunk finishes")
+    parser.add_argument("--generator", default="mailbox", choices=("mailbox", "bitboard"))
+    args = parser.parse_args(argv)
+
+    if args.epd:
+        fens = (game_state.to_fen() for game_state, _ in read_positions(args.epd, args.generator, reuse=True))
+    else:
+        fens = game_positions(args.pgn, args.generator)
+    stats = BatchStats()
+    for result in run_batch(fens, args.task, args.depth, args.workers, args.chunk_size, not args.unordered,
+                            args.generator, stats):
+        sys.stdout.write(json.dumps(result.to_dict()) + "\n")
+    sys.stderr.write(json.dumps(stats.to_dict()) + "\n")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,291 @@
+"""
+Bitboard move generator. Each piece type and colour is a 64-bit int (bit r * 8 + c is the square at row r, column c)
+and moves come from precomputed knight/king/pawn attack tables and classical ray lookups for the sliders, instead of
+stepping square by square. Select it with GameState(generator="bitboard"); it follows the same legality rules and
+returns the same set of moves as the mailbox generator in ChessEngine, though not in the same order. The bitboards
+are not rebuilt per call: GameState updates them in apply_move/unmake_move, like the zobrist key.
+
+It is not a performance backend. Under CPython it is slower than the mailbox generator (perft depth 4 runs at roughly
+0.6-1.0x its nodes per second): walking rays and set bits one Python operation at a time costs more than the mailbox's
+direct indexing. It is kept as an independent second implementation that perft can check the mailbox generator
+against (python -m Chess.perft --generator bitboard).
+"""
+from Chess.ChessEngine import BOARD_SQUARES, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, WHITE, BLACK, MOVES, \
+    get_move, TO_SHIFT, ENPASSANT_FLAG, CASTLE_FLAG, MOVED_SHIFT, CAPTURED_SHIFT, PROMOTION_BITS, FROM_CODES, \
+    CASTLES, WHITE_CASTLE_RIGHTS, BLACK_CASTLE_RIGHTS
+
+# (row step, col step) for each ray; the first four are rook rays, the last four bishop rays
+RAY_DIRECTIONS = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
+KNIGHT_STEPS = ((-1, -2), (-2, -1), (-2, 1), (-1, 2), (1, -2), (2, -1), (2, 1), (1, 2))
+SQUARE_RC = [(sq // 8, sq % 8) for sq in range(64)]
+
+
+def _build_rays():
+    rays = []
+    for d_row, d_col in RAY_DIRECTIONS:
+        table = []
+        for sq in range(64):
+            r, c = SQUARE_RC[sq]
+            bb = 0
+            r, c = r + d_row, c + d_col
+            while 0 <= r < 8 and 0 <= c < 8:
+                bb |= 1 << (r * 8 + c)
+                r, c = r + d_row, c + d_col
+            table.append(bb)
+        rays.append(table)
+    return rays
+
+
+def _build_leaper(steps):
+    table = []
+    for sq in range(64):
+        r, c = SQUARE_RC[sq]
+        bb = 0
+        for d_row, d_col in steps:
+            if 0 <= r + d_row < 8 and 0 <= c + d_col < 8:
+                bb |= 1 << ((r + d_row) * 8 + c + d_col)
+        table.append(bb)
+    return table
+
+
+RAYS = _build_rays()
+# Rays pointing to higher square numbers find their nearest blocker with the lowest set bit, the others the highest
+RAY_INCREASING = tuple(d_row * 8 + d_col > 0 for d_row, d_col in RAY_DIRECTIONS)
+ROOK_RAYS = (0, 1, 2, 3)
+BISHOP_RAYS = (4, 5, 6, 7)
+OPPOSITE_RAY = (2, 3, 0, 1, 7, 6, 5, 4)
+KNIGHT_ATTACKS = _build_leaper(KNIGHT_STEPS)
+KING_ATTACKS = _build_leaper(RAY_DIRECTIONS)
+PAWN_ATTACKS = {WHITE: _build_leaper(((-1, -1), (-1, 1))), BLACK: _build_leaper(((1, -1), (1, 1)))}
+# Squares strictly between two squares on a shared ray, and the direction index of that ray (or -1)
+BETWEEN = [[0] * 64 for _ in range(64)]
+RAY_INDEX = [[-1] * 64 for _ in range(64)]
+for _j in range(8):
+    for _a in range(64):
+        _ray = RAYS[_j][_a]
+        while _ray:
+            _lsb = _ray & -_ray
+            _b = _lsb.bit_length() - 1
+            _ray ^= _lsb
+            RAY_INDEX[_a][_b] = _j
+            BETWEEN[_a][_b] = RAYS[_j][_a] & RAYS[OPPOSITE_RAY[_j]][_b]
+
+
+def first_blocker(j, sq, occupied):
+    blockers = RAYS[j][sq] & occupied
+    if not blockers:
+        return -1
+    if RAY_INCREASING[j]:
+        return (blockers & -blockers).bit_length() - 1
+    return blockers.bit_length() - 1
+
+
+def ray_attacks(j, sq, occupied):
+    attacks = RAYS[j][sq]
+    blockers = attacks & occupied
+    if blockers:
+        if RAY_INCREASING[j]:
+            attacks ^= RAYS[j][(blockers & -blockers).bit_length() - 1]
+        else:
+            attacks ^= RAYS[j][blockers.bit_length() - 1]
+    return attacks
+
+
+def rook_attacks(sq, occupied):
+    return ray_attacks(0, sq, occupied) | ray_attacks(1, sq, occupied) | \
+        ray_attacks(2, sq, occupied) | ray_attacks(3, sq, occupied)
+
+
+def bishop_attacks(sq, occupied):
+    return ray_attacks(4, sq, occupied) | ray_attacks(5, sq, occupied) | \
+        ray_attacks(6, sq, occupied) | ray_attacks(7, sq, occupied)
+
+
+def squares(bb):
+    while bb:
+        lsb = bb & -bb
+        yield lsb.bit_length() - 1
+        bb ^= lsb
+
+
+'''
+Builds the bitboards of a mailbox: a list indexed by piece code, with the white and black occupancy at the WHITE and
+BLACK indexes (codes no piece uses). GameState keeps such a list up to date move by move for this generator
+'''
+def mailbox_bitboards(mailbox):
+    pieces = [0] * ((BLACK | KING) + 1)
+    bit = 1
+    for sq in BOARD_SQUARES:
+        piece = mailbox[sq]
+        if piece:
+            pieces[piece] |= bit
+        bit <<= 1
+    pieces[WHITE] = pieces[WHITE | PAWN] | pieces[WHITE | KNIGHT] | pieces[WHITE | BISHOP] | pieces[WHITE | ROOK] | \
+        pieces[WHITE | QUEEN] | pieces[WHITE | KING]
+    pieces[BLACK] = pieces[BLACK | PAWN] | pieces[BLACK | KNIGHT] | pieces[BLACK | BISHOP] | pieces[BLACK | ROOK] | \
+        pieces[BLACK | QUEEN] | pieces[BLACK | KING]
+    return pieces
+
+
+'''
+Is sq attacked by the opponent of friend, given that occupancy? pieces is indexed by piece code as from
+mailbox_bitboards
+'''
+def square_attacked(sq, friend, pieces, occupied):
+    enemy = BLACK if friend == WHITE else WHITE
+    return bool(KNIGHT_ATTACKS[sq] & pieces[enemy | KNIGHT] or KING_ATTACKS[sq] & pieces[enemy | KING] or
+                PAWN_ATTACKS[friend][sq] & pieces[enemy | PAWN] or
+                rook_attacks(sq, occupied) & (pieces[enemy | ROOK] | pieces[enemy | QUEEN]) or
+                bishop_attacks(sq, occupied) & (pieces[enemy | BISHOP] | pieces[enemy | QUEEN]))
+
+
+class BitboardGenerator:
+    '''
+    Legal moves for the side to move in game_state, using the same contract as GameState.get_valid_moves
+    '''
+    def get_valid_moves(self, game_state):
+        pieces = game_state.bitboards
+        white, black = pieces[WHITE], pieces[BLACK]
+        if game_state.White_To_Move:
+            friend, enemy, own, other = WHITE, BLACK, white, black
+            forward = -8
+        else:
+            friend, enemy, own, other = BLACK, WHITE, black, white
+            forward = 8
+        king_bb = pieces[friend | KING]
+        if not king_bb:
+            return False  # No king found
+        occupied = own | other
+        king = king_bb.bit_length() - 1
+        mailbox = game_state.mailbox
+
+        # Checkers: anything attacking the king square, including an adjacent king
+        enemy_straight = pieces[enemy | ROOK] | pieces[enemy | QUEEN]
+        enemy_diagonal = pieces[enemy | BISHOP] | pieces[enemy | QUEEN]
+        checks = []
+        pins = {}  # pinned square -> ray index from the king
+        for j in range(8):
+            blocker = first_blocker(j, king, occupied)
+            if blocker == -1:
+                continue
+            bit = 1 << blocker
+            sliders = enemy_straight if j < 4 else enemy_diagonal
+            if bit & own:
+                beyond = first_blocker(j, blocker, occupied)
+                if beyond != -1 and (1 << beyond) & sliders:
+                    pins[blocker] = j
+            elif bit & sliders:
+                checks.append(blocker)
+        checkers = (KNIGHT_ATTACKS[king] & pieces[enemy | KNIGHT]) | \
+            (PAWN_ATTACKS[friend][king] & pieces[enemy | PAWN]) | (KING_ATTACKS[king] & pieces[enemy | KING])
+        checks.extend(squares(checkers))
+
+        moves = []
+        game_state.isCheck = bool(checks)
+        game_state.Pins = [SQUARE_RC[sq] + RAY_DIRECTIONS[j] for sq, j in pins.items()]
+        game_state.Checks = [SQUARE_RC[sq] + self.check_direction(king, sq) for sq in checks]
+        king_targets = self.safe_king_squares(king, KING_ATTACKS[king] & ~own, friend, pieces, occupied)
+        if len(checks) > 1:
+            self.add_moves(king, king_targets, mailbox, moves)
+            return moves
+        targets = ~own
+        if checks:
+            targets &= BETWEEN[king][checks[0]] | (1 << checks[0])
+
+        # Pawns
+        empty = ~occupied & 0xFFFFFFFFFFFFFFFF
+        enpassant = game_state.enpassant_move
+        enpassant_sq = enpassant[0] * 8 + enpassant[1] if enpassant else -1
+        home_row, last_row = (6, 1) if friend == WHITE else (1, 6)
+        pawn = friend | PAWN
+        for sq in squares(pieces[pawn]):
+            pin = pins.get(sq, -1)
+            base = sq | pawn << MOVED_SHIFT
+            promotions = PROMOTION_BITS if SQUARE_RC[sq][0] == last_row else (0,)
+            push = sq + forward
+            if (1 << push) & empty and (pin == -1 or RAY_INDEX[sq][push] in (pin, OPPOSITE_RAY[pin])):
+                if (1 << push) & targets:
+                    for promotion in promotions:
+                        moves.append(get_move(base | promotion | push << TO_SHIFT))
+                if SQUARE_RC[sq][0] == home_row and (1 << (push + forward)) & empty & targets:
+                    moves.append(get_move(base | (push + forward) << TO_SHIFT))
+            for end_sq in squares(PAWN_ATTACKS[friend][sq]):
+                if pin != -1 and RAY_INDEX[sq][end_sq] != pin:
+                    continue
+                if (1 << end_sq) & other & targets:
+                    for promotion in promotions:
+                        moves.append(get_move(base | promotion | end_sq << TO_SHIFT |
+                                              mailbox[BOARD_SQUARES[end_sq]] << CAPTURED_SHIFT))
+                elif end_sq == enpassant_sq and \
+                        ((1 << end_sq) & targets or checks and checks[0] == end_sq - forward) and \
+                        self.enpassant_is_legal(king, sq, end_sq, end_sq - forward, enemy, pieces, occupied):
+                    moves.append(get_move(base | end_sq << TO_SHIFT | ENPASSANT_FLAG))
+
+        # Knights (a pinned knight can never move)
+        for sq in squares(pieces[friend | KNIGHT]):
+            if sq not in pins:
+                self.add_moves(sq, KNIGHT_ATTACKS[sq] & targets, mailbox, moves)
+
+        # Sliders, kept on the pin line when pinned
+        for piece_type, rays in ((BISHOP, BISHOP_RAYS), (ROOK, ROOK_RAYS), (QUEEN, BISHOP_RAYS + ROOK_RAYS)):
+            for sq in squares(pieces[friend | piece_type]):
+                pin = pins.get(sq, -1)
+                attacks = 0
+                for j in rays:
+                    if pin == -1 or j == pin or j == OPPOSITE_RAY[pin]:
+                        attacks |= ray_attacks(j, sq, occupied)
+                self.add_moves(sq, attacks & targets, mailbox, moves)
+
+        self.add_moves(king, king_targets, mailbox, moves)
+
+        # Castling, never out of check
+        rights = game_state.castle_rights & (WHITE_CASTLE_RIGHTS if friend == WHITE else BLACK_CASTLE_RIGHTS)
+        if rights and not checks:
+            for right, king_sq, target, rook_sq, between, path in CASTLES:
+                if rights & right and FROM_CODES[king_sq] == king and mailbox[rook_sq] == friend | ROOK and \
+                        not any(occupied >> FROM_CODES[sq] & 1 for sq in between) and \
+                        not any(square_attacked(FROM_CODES[sq], friend, pieces, occupied) for sq in path):
+                    moves.append(get_move(king | FROM_CODES[target] << TO_SHIFT | (friend | KING) << MOVED_SHIFT |
+                                          CASTLE_FLAG))
+        return moves
+
+    '''
+    The squares in candidates the king can step to. The king is taken out of the occupancy first, so a slider checking
+    along a line also covers the square behind the king
+    '''
+    @staticmethod
+    def safe_king_squares(king, candidates, friend, pieces, occupied):
+        occupied &= ~(1 << king)
+        safe = 0
+        for sq in squares(candidates):
+            if not square_attacked(sq, friend, pieces, occupied):
+                safe |= 1 << sq
+        return safe
+
+    '''
+    En passant empties two squares of one rank at once, which the pin scan can't see; replay it on the occupancy
+    '''
+    @staticmethod
+    def enpassant_is_legal(king, start, end_sq, captured_sq, enemy, pieces, occupied):
+        occupied = (occupied & ~(1 << start) & ~(1 << captured_sq)) | (1 << end_sq)
+        return not (rook_attacks(king, occupied) & (pieces[enemy | ROOK] | pieces[enemy | QUEEN]) or
+                    bishop_attacks(king, occupied) & (pieces[enemy | BISHOP] | pieces[enemy | QUEEN]))
+
+    @staticmethod
+    def add_moves(start, targets, mailbox, moves):
+        interned = MOVES.get
+        base = start | mailbox[BOARD_SQUARES[start]] << MOVED_SHIFT
+        targets &= 0xFFFFFFFFFFFFFFFF
+        while targets:
+            lsb = targets & -targets
+            end_sq = lsb.bit_length() - 1
+            code = base | end_sq << TO_SHIFT | mailbox[BOARD_SQUARES[end_sq]] << CAPTURED_SHIFT
+            moves.append(interned(code) or get_move(code))
+            targets ^= lsb
+
+    @staticmethod
+    def check_direction(king, checker):
+        j = RAY_INDEX[king][checker]
+        if j != -1:
+            return RAY_DIRECTIONS[j]
+        return SQUARE_RC[checker][0] - SQUARE_RC[king][0], SQUARE_RC[checker][1] - SQUARE_RC[king][1]
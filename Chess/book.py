@@ -0,0 +1,187 @@
+"""
+Opening book. A PGN corpus is compiled into a sorted binary file of fixed-size entries, in the style of Polyglot
+books: 16 bytes each, big-endian (position key u64, move u16, weight u16, learn u32). The key is GameState's zobrist
+key and the move is the moveID of the Move, so entries are matched without any notation parsing. The reader maps the
+file and binary-searches it, so opening even a large book costs nothing up front:
+
+    python -m Chess.book games.pgn book.bin --max-ply 24
+
+    book = OpeningBook("book.bin")
+    move = book.choose_move(game_state)  # None once out of book
+
+Weights count how often a move was played, with a win for the side playing it counting twice and a loss not at all,
+as Polyglot's builder does.
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+
+from Chess.pgn import read_games, san_to_move, start_position
+
+ENTRY = struct.Struct(">QHHI")
+ENTRY_SIZE = ENTRY.size  # 16
+KEY = struct.Struct(">Q")
+MAX_WEIGHT = 0xFFFF
+DEFAULT_BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "book.bin")
+RESULT_POINTS = {"1-0": (2, 0), "0-1": (0, 2), "1/2-1/2": (1, 1)}  # (white, black)
+
+
+'''
+Plays through every game of a PGN source and counts (position key, moveID) -> weight over the first max_ply plies.
+Games with an illegal move are used up to that move
+'''
+def collect_moves(source, max_ply=24, weights=None, stats=None):
+    if weights is None:
+        weights = {}
+    for game in read_games(source):
+        white_points, black_points = RESULT_POINTS.get(game.result, (1, 1))
+        try:
+            game_state = start_position(game.headers)
+            for san in game.sans[:max_ply]:
+                move = san_to_move(game_state, san)
+                points = white_points if game_state.White_To_Move else black_points
+                if points:
+                    entry = (game_state.zobrist_key, move.moveID)
+                    weights[entry] = weights.get(entry, 0) + points
+                game_state.apply_move(move)
+        except ValueError:
+            if stats is not None:
+                stats["errors"] += 1
+        if stats is not None:
+            stats["games"] += 1
+    return weights
+
+
+'''
+Writes the collected moves sorted by key, best move first within a key. Moves seen fewer than min_weight times are
+left out; weights are scaled down per position if they don't fit in 16 bits. Returns the number of entries
+'''
+def write_book(weights, path, min_weight=1):
+    by_key = {}
+    for (key, move_id), weight in weights.items():
+        if weight >= min_weight:
+            by_key.setdefault(key, []).append((weight, move_id))
+    count = 0
+    with open(path, "wb") as file:
+        for key in sorted(by_key):
+            moves = sorted(by_key[key], key=lambda entry: (-entry[0], entry[1]))
+            scale = max(1, -(-moves[0][0] // MAX_WEIGHT))
+            for weight, move_id in moves:
+                file.write(ENTRY.pack(key, move_id, max(1, weight // scale), 0))
+                count += 1
+    return count
+
+
+def build_book(source, path, max_ply=24, min_weight=1, stats=None):
+    return write_book(collect_moves(source, max_ply, stats=stats), path, min_weight)
+
+
+class OpeningBook:
+    '''
+    Read-only view of a book file. rng, a random.Random, makes choose_move pick moves in proportion to their weight;
+    without it the heaviest move is always played
+    '''
+    def __init__(self, path, rng=None):
+        self.path = path
+        self.rng = rng
+        self.file = open(path, "rb")
+        size = os.fstat(self.file.fileno()).st_size
+        if size % ENTRY_SIZE:
+            self.file.close()
+            raise ValueError("%s is not a book file: size %d is not a multiple of %d" % (path, size, ENTRY_SIZE))
+        self.length = size // ENTRY_SIZE
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def __len__(self):
+        return self.length
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
+
+    def key_at(self, index):
+        return KEY.unpack_from(self.data, index * ENTRY_SIZE)[0]
+
+    '''
+    (moveID, weight) of every book move for a zobrist key, heaviest first
+    '''
+    def entries(self, key):
+        low, high = 0, self.length
+        while low < high:
+            middle = (low + high) // 2
+            if self.key_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        found = []
+        for index in range(low, self.length):
+            entry_key, move_id, weight, _ = ENTRY.unpack_from(self.data, index * ENTRY_SIZE)
+            if entry_key != key:
+                break
+            found.append((move_id, weight))
+        return found
+
+    '''
+    The book moves of the position as (Move, weight) pairs from game_state's legal moves. An entry that isn't legal
+    here (a key collision, or a book built with different rules) is skipped
+    '''
+    def moves(self, game_state):
+        entries = self.entries(game_state.zobrist_key)
+        if not entries:
+            return []
+        legal = {move.moveID: move for move in game_state.get_valid_moves() or []}
+        return [(legal[move_id], weight) for move_id, weight in entries if move_id in legal]
+
+    def choose_move(self, game_state):
+        moves = self.moves(game_state)
+        if not moves:
+            return None
+        if self.rng is None:
+            return moves[0][0]
+        pick = self.rng.randrange(sum(weight for _, weight in moves))
+        for move, weight in moves:
+            pick -= weight
+            if pick < 0:
+                return move
+        return moves[-1][0]
+
+
+'''
+The book shipped next to the package, if there is one
+'''
+def open_default_book(rng=None):
+    if os.path.exists(DEFAULT_BOOK_PATH):
+        return OpeningBook(DEFAULT_BOOK_PATH, rng)
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile a PGN corpus into an opening book")
+    parser.add_argument("pgn")
+    parser.add_argument("book", nargs="?", default=DEFAULT_BOOK_PATH)
+    parser.add_argument("--max-ply", type=int, default=24, help="plies of each game to include")
+    parser.add_argument("--min-weight", type=int, default=1, help="drop moves with a smaller total weight")
+    args = parser.parse_args(argv)
+
+    stats = {"games": 0, "errors": 0}
+    start = time.perf_counter()
+    entries = build_book(args.pgn, args.book, args.max_ply, args.min_weight, stats)
+    stats.update(entries=entries, bytes=entries * ENTRY_SIZE, seconds=round(time.perf_counter() - start, 3))
+    json.dump(stats, sys.stdout)
+    sys.stdout.write("\n")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,206 @@
+"""
+Exports positions as NumPy arrays for model training. Positions are gathered a chunk at a time (the only per-position
+Python work is copying 64 piece codes and listing the legal moves), encoded with vectorised NumPy operations and
+appended to .npy files, whose headers are fixed up once the final count is known. The files open memory-mapped:
+
+    count = export_positions((record.game_state for record in replay_positions("games.pgn")), "out/games")
+    planes = numpy.load("out/games_planes.npy", mmap_mode="r")
+
+    python -m Chess.dataset --pgn games.pgn --out out/games
+
+Arrays, N positions:
+    planes     (N, 12, 8, 8) uint8   one plane per piece, white P N B R Q K then black, row 0 is the eighth rank
+    side       (N,) uint8            1 when white is to move
+    castling   (N, 4) uint8          K Q k q rights
+    enpassant  (N, 8) uint8          one-hot file of the en passant square
+    legal      (N, 512) uint8        packed bits of a 4096 mask, bit from + 64 * to (squares as r * 8 + c) per move
+    eval       (N,) int32            static evaluation from the side to move's view
+
+NumPy is only needed by this module.
+"""
+import argparse
+import json
+import struct
+import sys
+import time
+
+try:
+    import numpy
+except ImportError:  # the engine works without NumPy; only exporting needs it
+    numpy = None
+
+from Chess.ChessEngine import WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING
+from Chess.evaluation import evaluate, board_codes
+
+PLANE_PIECES = tuple(colour | piece_type for colour in (WHITE, BLACK)
+                     for piece_type in (PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING))
+MOVE_MASK_SIZE = 64 * 64
+NPY_HEADER_SIZE = 256  # fixed, so the header can be rewritten in place with the final shape
+
+
+def require_numpy():
+    if numpy is None:
+        raise ImportError("Exporting datasets needs NumPy: pip install numpy")
+
+
+'''
+Move index used by the legal-move mask: start square + 64 * end square. Promotions to different pieces share an index
+'''
+def move_index(move):
+    return move.code & (MOVE_MASK_SIZE - 1)
+
+
+class PositionBuffer:
+    '''
+    Raw per-position data copied out of a GameState, so a reused GameState can move on straight away
+    '''
+    def __init__(self):
+        self.codes = bytearray()
+        self.side = bytearray()
+        self.castling = bytearray()
+        self.enpassant = []
+        self.moves = []
+        self.evals = []
+
+    def __len__(self):
+        return len(self.side)
+
+    def add(self, game_state):
+        self.codes += board_codes(game_state)
+        self.side.append(game_state.White_To_Move)
+        self.castling.append(game_state.castle_rights)
+        self.enpassant.append(game_state.enpassant_move[1] if game_state.enpassant_move else -1)
+        self.moves.append([move_index(move) for move in game_state.get_valid_moves() or []])
+        self.evals.append(evaluate(game_state))
+
+
+'''
+Turns a PositionBuffer into the arrays listed in the module docstring, without Python loops over squares
+'''
+def encode_buffer(buffer):
+    require_numpy()
+    n = len(buffer)
+    codes = numpy.frombuffer(bytes(buffer.codes), dtype=numpy.uint8).reshape(n, 64)
+    planes = (codes[:, None, :] == numpy.array(PLANE_PIECES, dtype=numpy.uint8)[None, :, None])
+    rights = numpy.frombuffer(bytes(buffer.castling), dtype=numpy.uint8)
+    enpassant = numpy.array(buffer.enpassant, dtype=numpy.int8)
+
+    counts = numpy.fromiter((len(moves) for moves in buffer.moves), dtype=numpy.intp, count=n)
+    legal = numpy.zeros((n, MOVE_MASK_SIZE), dtype=bool)
+    if counts.sum():
+        rows = numpy.repeat(numpy.arange(n), counts)
+        columns = numpy.fromiter((index for moves in buffer.moves for index in moves), dtype=numpy.intp,
+                                 count=int(counts.sum()))
+        legal[rows, columns] = True
+
+    return {
+        "planes": planes.reshape(n, 12, 8, 8).astype(numpy.uint8),
+        "side": numpy.frombuffer(bytes(buffer.side), dtype=numpy.uint8).copy(),
+        "castling": ((rights[:, None] >> numpy.arange(4, dtype=numpy.uint8)) & 1).astype(numpy.uint8),
+        "enpassant": (enpassant[:, None] == numpy.arange(8)).astype(numpy.uint8),
+        "legal": numpy.packbits(legal, axis=1),
+        "eval": numpy.array(buffer.evals, dtype=numpy.int32),
+    }
+
+
+def encode_positions(game_states):
+    buffer = PositionBuffer()
+    for game_state in game_states:
+        buffer.add(game_state)
+    return encode_buffer(buffer)
+
+
+class NpyAppender:
+    '''
+    Writes a .npy file whose first dimension grows as chunks are appended. The header has a fixed size and is
+    rewritten with the real length on close, so the data is written once, sequentially, and never held in memory
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "wb")
+        self.file.write(b"\0" * NPY_HEADER_SIZE)
+        self.dtype = None
+        self.item_shape = None
+        self.length = 0
+
+    def append(self, array):
+        if self.dtype is None:
+            self.dtype = array.dtype
+            self.item_shape = array.shape[1:]
+        elif array.shape[1:] != self.item_shape or array.dtype != self.dtype:
+            raise ValueError("Chunk shape or dtype differs from the first chunk in " + self.path)
+        self.file.write(numpy.ascontiguousarray(array).tobytes())
+        self.length += len(array)
+
+    def close(self):
+        dtype = self.dtype if self.dtype is not None else numpy.dtype(numpy.uint8)
+        shape = (self.length,) + (self.item_shape or ())
+        header = "{'descr': %r, 'fortran_order': False, 'shape': %r, }" % (
+            numpy.lib.format.dtype_to_descr(dtype), shape)
+        header = header.encode("latin1")
+        padding = NPY_HEADER_SIZE - 10 - len(header) - 1
+        if padding < 0:
+            raise ValueError("Shape too large for the fixed .npy header")
+        self.file.seek(0)
+        self.file.write(b"\x93NUMPY\x01\x00" + struct.pack("<H", NPY_HEADER_SIZE - 10) + header +
+                        b" " * padding + b"\n")
+        self.file.close()
+
+
+'''
+Encodes every position from game_states (any iterable of GameStates, which may be one GameState reused) chunk by
+chunk into <prefix>_<name>.npy files. Returns the number of positions
+'''
+def export_positions(game_states, prefix, chunk_size=4096):
+    require_numpy()
+    writers = {}
+    count = 0
+    buffer = PositionBuffer()
+    try:
+        for game_state in game_states:
+            buffer.add(game_state)
+            if len(buffer) >= chunk_size:
+                count += _flush(buffer, prefix, writers)
+                buffer = PositionBuffer()
+        if len(buffer):
+            count += _flush(buffer, prefix, writers)
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return count
+
+
+def _flush(buffer, prefix, writers):
+    for name, array in encode_buffer(buffer).items():
+        if name not in writers:
+            writers[name] = NpyAppender("%s_%s.npy" % (prefix, name))
+        writers[name].append(array)
+    return len(buffer)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export positions as NumPy training arrays")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--pgn", help="PGN archive; every position reached is exported")
+    source.add_argument("--epd", help="EPD/FEN file, one position per line")
+    parser.add_argument("--out", required=True, help="prefix of the .npy files to write")
+    parser.add_argument("--chunk-size", type=int, default=4096)
+    args = parser.parse_args(argv)
+
+    if args.pgn:
+        from Chess.pgn import replay_positions
+        game_states = (record.game_state for record in replay_positions(args.pgn))
+    else:
+        from Chess.epd import read_positions
+        game_states = (game_state for game_state, _ in read_positions(args.epd, reuse=True))
+    start = time.perf_counter()
+    count = export_positions(game_states, args.out, args.chunk_size)
+    seconds = time.perf_counter() - start
+    json.dump({"positions": count, "seconds": round(seconds, 3),
+               "positions_per_second": round(count / seconds, 1) if seconds > 0 else 0.0}, sys.stdout)
+    sys.stdout.write("\n")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,75 @@
+"""
+Streaming reader for EPD and FEN position files. Lines are read and parsed one at a time, so a test suite with
+millions of positions never has to fit in memory:
+
+    for game_state, operations in read_positions("suite.epd"):
+        ...
+
+An EPD line is the first four FEN fields followed by "opcode operand...;" operations (for example
+'bm Nf3; id "WAC.001";' or the perft suite's ";D1 20 ;D2 400"). Plain FEN lines with clock fields work too.
+"""
+from Chess.ChessEngine import GameState
+
+
+'''
+Splits an EPD/FEN line into (fen, operations). operations maps each opcode to its operand string
+'''
+def parse_epd_line(line):
+    fields = line.split(None, 4)
+    if len(fields) < 4:
+        raise ValueError("EPD line needs at least 4 fields: " + line)
+    fen = " ".join(fields[:4])
+    rest = fields[4] if len(fields) > 4 else ""
+
+    # Optional halfmove and fullmove clocks make it a full FEN line
+    clocks = rest.split(None, 2)
+    if len(clocks) >= 2 and clocks[0].isdigit() and clocks[1].isdigit():
+        fen += " " + clocks[0] + " " + clocks[1]
+        rest = clocks[2] if len(clocks) > 2 else ""
+
+    operations = {}
+    for operation in split_operations(rest):
+        opcode, _, operand = operation.partition(" ")
+        operations[opcode] = operand.strip().strip('"')
+    return fen, operations
+
+
+def split_operations(text):
+    operations = []
+    current = ""
+    quoted = False
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+        if char == ';' and not quoted:
+            if current.strip():
+                operations.append(current.strip())
+            current = ""
+        else:
+            current += char
+    if current.strip():
+        operations.append(current.strip())
+    return operations
+
+
+'''
+Yields (game_state, operations) for every position in a file path or an open text file, skipping blank lines and
+"#" comments. With reuse=True the same GameState is reloaded for each line instead of building a new one, which is
+faster for bulk work but means a yielded position is only valid until the next one is read
+'''
+def read_positions(source, generator="mailbox", reuse=False):
+    if isinstance(source, str):
+        with open(source) as lines:
+            yield from read_positions(lines, generator, reuse)
+        return
+    game_state = GameState(generator) if reuse else None
+    for line in source:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        fen, operations = parse_epd_line(line)
+        if reuse:
+            game_state.set_fen(fen)
+            yield game_state, operations
+        else:
+            yield GameState.from_fen(fen, generator), operations
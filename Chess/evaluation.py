@@ -0,0 +1,233 @@
+"""
+Static evaluation: material plus piece-square tables, tapered between a midgame and an endgame score by how much
+non-pawn material is left (the PeSTO tables). GameState keeps mg_score, eg_score and phase up to date in
+apply_move/unmake_move from the moved, captured and promoted pieces, so evaluate() is O(1); compute_scores rebuilds
+them from scratch for verification (GameState.debug_evaluation = True checks every move).
+
+evaluate_batch scores many boards at once with NumPy, for labelling datasets. NumPy is optional and only needed there.
+
+The tables are indexed by the mailbox piece codes and mailbox square indices of ChessEngine, like the zobrist
+tables. ChessEngine imports this module, so the few codes needed are repeated here rather than imported.
+"""
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = 1, 2, 3, 4, 5, 6
+WHITE, BLACK = 8, 16
+SQUARE_TO_MAILBOX = tuple(21 + 10 * r + c for r in range(8) for c in range(8))  # r * 8 + c -> mailbox index
+
+MG_VALUES = (0, 82, 337, 365, 477, 1025, 0)
+EG_VALUES = (0, 94, 281, 297, 512, 936, 0)
+PHASE_WEIGHTS = (0, 0, 1, 1, 2, 4, 0)  # by piece type; the full starting set adds up to MAX_PHASE
+MAX_PHASE = 24
+
+# From white's side, a8 first (row 0 is the eighth rank, as on Board)
+MG_PST = {
+    PAWN: (
+        0, 0, 0, 0, 0, 0, 0, 0,
+        98, 134, 61, 95, 68, 126, 34, -11,
+        -6, 7, 26, 31, 65, 56, 25, -20,
+        -14, 13, 6, 21, 23, 12, 17, -23,
+        -27, -2, -5, 12, 17, 6, 10, -25,
+        -26, -4, -4, -10, 3, 3, 33, -12,
+        -35, -1, -20, -23, -15, 24, 38, -22,
+        0, 0, 0, 0, 0, 0, 0, 0),
+    KNIGHT: (
+        -167, -89, -34, -49, 61, -97, -15, -107,
+        -73, -41, 72, 36, 23, 62, 7, -17,
+        -47, 60, 37, 65, 84, 129, 73, 44,
+        -9, 17, 19, 53, 37, 69, 18, 22,
+        -13, 4, 16, 13, 28, 19, 21, -8,
+        -23, -9, 12, 10, 19, 17, 25, -16,
+        -29, -53, -12, -3, -1, 18, -14, -19,
+        -105, -21, -58, -33, -17, -28, -19, -23),
+    BISHOP: (
+        -29, 4, -82, -37, -25, -42, 7, -8,
+        -26, 16, -18, -13, 30, 59, 18, -47,
+        -16, 37, 43, 40, 35, 50, 37, -2,
+        -4, 5, 19, 50, 37, 37, 7, -2,
+        -6, 13, 13, 26, 34, 12, 10, 4,
+        0, 15, 15, 15, 14, 27, 18, 10,
+        4, 15, 16, 0, 7, 21, 33, 1,
+        -33, -3, -14, -21, -13, -12, -39, -21),
+    ROOK: (
+        32, 42, 32, 51, 63, 9, 31, 43,
+        27, 32, 58, 62, 80, 67, 26, 44,
+        -5, 19, 26, 36, 17, 45, 61, 16,
+        -24, -11, 7, 26, 24, 35, -8, -20,
+        -36, -26, -12, -1, 9, -7, 6, -23,
+        -45, -25, -16, -17, 3, 0, -5, -33,
+        -44, -16, -20, -9, -1, 11, -6, -71,
+        -19, -13, 1, 17, 16, 7, -37, -26),
+    QUEEN: (
+        -28, 0, 29, 12, 59, 44, 43, 45,
+        -24, -39, -5, 1, -16, 57, 28, 54,
+        -13, -17, 7, 8, 29, 56, 47, 57,
+        -27, -27, -16, -16, -1, 17, -2, 1,
+        -9, -26, -9, -10, -2, -4, 3, -3,
+        -14, 2, -11, -2, -5, 2, 14, 5,
+        -35, -8, 11, 2, 8, 15, -3, 1,
+        -1, -18, -9, 10, -15, -25, -31, -50),
+    KING: (
+        -65, 23, 16, -15, -56, -34, 2, 13,
+        29, -1, -20, -7, -8, -4, -38, -29,
+        -9, 24, 2, -16, -20, 6, 22, -22,
+        -17, -20, -12, -27, -30, -25, -14, -36,
+        -49, -1, -27, -39, -46, -44, -33, -51,
+        -14, -14, -22, -46, -44, -30, -15, -27,
+        1, 7, -8, -64, -43, -16, 9, 8,
+        -15, 36, 12, -54, 8, -28, 24, 14),
+}
+EG_PST = {
+    PAWN: (
+        0, 0, 0, 0, 0, 0, 0, 0,
+        178, 173, 158, 134, 147, 132, 165, 187,
+        94, 100, 85, 67, 56, 53, 82, 84,
+        32, 24, 13, 5, -2, 4, 17, 17,
+        13, 9, -3, -7, -7, -8, 3, -1,
+        4, 7, -6, 1, 0, -5, -1, -8,
+        13, 8, 8, 10, 13, 0, 2, -7,
+        0, 0, 0, 0, 0, 0, 0, 0),
+    KNIGHT: (
+        -58, -38, -13, -28, -31, -27, -63, -99,
+        -25, -8, -25, -2, -9, -25, -24, -52,
+        -24, -20, 10, 9, -1, -9, -19, -41,
+        -17, 3, 22, 22, 22, 11, 8, -18,
+        -18, -6, 16, 25, 16, 17, 4, -18,
+        -23, -3, -1, 15, 10, -3, -20, -22,
+        -42, -20, -10, -5, -2, -20, -23, -44,
+        -29, -51, -23, -15, -22, -18, -50, -64),
+    BISHOP: (
+        -14, -21, -11, -8, -7, -9, -17, -24,
+        -8, -4, 7, -12, -3, -13, -4, -14,
+        2, -8, 0, -1, -2, 6, 0, 4,
+        -3, 9, 12, 9, 14, 10, 3, 2,
+        -6, 3, 13, 19, 7, 10, -3, -9,
+        -12, -3, 8, 10, 13, 3, -7, -15,
+        -14, -18, -7, -1, 4, -9, -15, -27,
+        -23, -9, -23, -5, -9, -16, -5, -17),
+    ROOK: (
+        13, 10, 18, 15, 12, 12, 8, 5,
+        11, 13, 13, 11, -3, 3, 8, 3,
+        7, 7, 7, 5, 4, -3, -5, -3,
+        4, 3, 13, 1, 2, 1, -1, 2,
+        3, 5, 8, 4, -5, -6, -8, -11,
+        -4, 0, -5, -1, -7, -12, -8, -16,
+        -6, -6, 0, 2, -9, -9, -11, -3,
+        -9, 2, 3, -1, -5, -13, 4, -20),
+    QUEEN: (
+        -9, 22, 22, 27, 27, 19, 10, 20,
+        -17, 20, 32, 41, 58, 25, 30, 0,
+        -20, 6, 9, 49, 47, 35, 19, 9,
+        3, 22, 24, 45, 57, 40, 57, 36,
+        -18, 28, 19, 47, 31, 34, 39, 23,
+        -16, -27, 15, 6, 9, 17, 10, 5,
+        -22, -23, -30, -16, -16, -23, -36, -32,
+        -33, -28, -22, -43, -5, -32, -20, -41),
+    KING: (
+        -74, -35, -18, -18, -11, 15, 4, -17,
+        -12, 17, 14, 17, 17, 38, 23, 11,
+        10, 17, 23, 15, 20, 45, 44, 13,
+        -8, 22, 24, 27, 26, 33, 26, 3,
+        -18, -4, 21, 24, 27, 23, 9, -11,
+        -19, -3, 11, 21, 23, 16, 7, -9,
+        -27, -11, 4, 13, 14, 4, -5, -17,
+        -53, -34, -21, -11, -28, -14, -24, -43),
+}
+
+
+def _build_tables(values, pst):
+    # [piece code][r * 8 + c], material included, positive for white and negative for black
+    by_square = [[0] * 64 for _ in range(33)]
+    for piece_type in range(PAWN, KING + 1):
+        for sq in range(64):
+            by_square[WHITE | piece_type][sq] = values[piece_type] + pst[piece_type][sq]
+            by_square[BLACK | piece_type][sq] = -(values[piece_type] + pst[piece_type][sq ^ 56])  # mirrored rows
+    by_mailbox = [[0] * 120 for _ in range(33)]
+    for code in range(33):
+        for sq in range(64):
+            by_mailbox[code][SQUARE_TO_MAILBOX[sq]] = by_square[code][sq]
+    return by_square, by_mailbox
+
+
+MG_SQUARE_TABLE, MG_TABLE = _build_tables(MG_VALUES, MG_PST)
+EG_SQUARE_TABLE, EG_TABLE = _build_tables(EG_VALUES, EG_PST)
+PHASE = [PHASE_WEIGHTS[code & 7] if code & 7 <= KING else 0 for code in range(33)]  # by piece code
+
+
+'''
+(midgame score, endgame score, phase) of a mailbox from scratch, scores from white's side
+'''
+def compute_scores(mailbox):
+    mg = eg = phase = 0
+    for sq in SQUARE_TO_MAILBOX:
+        piece = mailbox[sq]
+        if piece:
+            mg += MG_TABLE[piece][sq]
+            eg += EG_TABLE[piece][sq]
+            phase += PHASE[piece]
+    return mg, eg, phase
+
+
+def taper(mg, eg, phase):
+    phase = min(phase, MAX_PHASE)  # early promotions can push it past the starting material
+    return (mg * phase + eg * (MAX_PHASE - phase)) // MAX_PHASE
+
+
+'''
+Score in centipawns from the side to move's point of view, from GameState's incrementally kept terms
+'''
+def evaluate(game_state):
+    score = taper(game_state.mg_score, game_state.eg_score, game_state.phase)
+    return score if game_state.White_To_Move else -score
+
+
+'''
+The same score rebuilt from the board, for checking the incremental one
+'''
+def evaluate_full(game_state):
+    score = taper(*compute_scores(game_state.mailbox))
+    return score if game_state.White_To_Move else -score
+
+
+'''
+64 piece codes in r * 8 + c order, the board layout evaluate_batch takes
+'''
+def board_codes(game_state):
+    mailbox = game_state.mailbox
+    return bytes(mailbox[sq] for sq in SQUARE_TO_MAILBOX)
+
+
+_numpy_tables = None
+
+
+def _load_numpy():
+    global _numpy_tables
+    if _numpy_tables is None:
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError("evaluate_batch needs NumPy: pip install numpy")
+        _numpy_tables = (numpy, numpy.array(MG_SQUARE_TABLE, dtype=numpy.int32),
+                         numpy.array(EG_SQUARE_TABLE, dtype=numpy.int32), numpy.array(PHASE, dtype=numpy.int32))
+    return _numpy_tables
+
+
+'''
+Scores N boards at once. boards is an (N, 64) array of piece codes (see board_codes) or a list of GameStates;
+white_to_move, an (N,) bool array, turns the scores to the side to move's view like evaluate, otherwise they are
+from white's side. Returns an (N,) int32 array
+'''
+def evaluate_batch(boards, white_to_move=None):
+    numpy, mg_table, eg_table, phase_table = _load_numpy()
+    if len(boards) and hasattr(boards[0], 'mailbox'):
+        white_to_move = numpy.array([game_state.White_To_Move for game_state in boards])
+        boards = [board_codes(game_state) for game_state in boards]
+    if not isinstance(boards, numpy.ndarray):
+        boards = numpy.frombuffer(b"".join(bytes(board) for board in boards), dtype=numpy.uint8).reshape(-1, 64)
+    boards = boards.astype(numpy.intp, copy=False)
+    squares = numpy.arange(64)
+    mg = mg_table[boards, squares].sum(axis=1)
+    eg = eg_table[boards, squares].sum(axis=1)
+    phase = numpy.minimum(phase_table[boards].sum(axis=1), MAX_PHASE)
+    scores = ((mg * phase + eg * (MAX_PHASE - phase)) // MAX_PHASE).astype(numpy.int32)
+    if white_to_move is not None:
+        scores = numpy.where(numpy.asarray(white_to_move), scores, -scores)
+    return scores
@@ -0,0 +1,329 @@
+"""
+Opt-in instrumentation of one GameState: call counts, inclusive times and moves generated for each piece generator,
+the pin and check scan, castling, check evasions, get_valid_moves and make/unmake, plus undo stack size and the number
+of distinct Move objects built. Nothing is changed until it is switched on; switching on replaces the methods on that
+one instance with counting wrappers, and remove() puts the plain ones back, so other GameStates never pay for it:
+
+    stats = game_state.instrument()
+    perft(game_state, 4)
+    print(stats.snapshot())
+    stats.remove()
+
+profile() runs a workload under cProfile, or samples its call stacks for a flame graph:
+
+    with profile("perft.collapsed", format="collapsed"):
+        perft(game_state, 4)
+
+    python -m Chess.instrument --perft 4 --profile perft.prof
+    python -m Chess.instrument --pgn games.pgn --profile replay.collapsed --format collapsed
+
+"collapsed" output is one "outer;inner;leaf count" line per stack, as read by flamegraph.pl and speedscope. "pstats"
+can be opened with pstats or snakeviz, and "text" is the pstats listing sorted by cumulative time.
+"""
+import argparse
+import cProfile
+import contextlib
+import io
+import json
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+
+from Chess.ChessEngine import GameState, MOVES, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING
+
+GENERATORS = {PAWN: "pawn", KNIGHT: "knight", BISHOP: "bishop", ROOK: "rook", QUEEN: "queen", KING: "king"}
+# Instance methods wrapped as a whole: counter name -> method name
+METHODS = {
+    "get_valid_moves": "get_valid_moves",
+    "generate": "generate_valid_moves",
+    "pins_and_checks": "check_for_pins_and_check",
+    "castling": "get_castle_moves",
+    "evasions": "get_check_evasions",
+    "filtered_evasions": "get_filtered_check_evasions",
+    "make": "apply_move",
+    "unmake": "unmake_move",
+}
+FORMATS = ("pstats", "text", "collapsed")
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+
+class Instrumentation:
+    '''
+    Counters for one GameState. timers=False only counts, which roughly halves the overhead. allocations=True also
+    traces memory allocated by Python while instrumented (tracemalloc), which is much slower
+    '''
+    def __init__(self, game_state, timers=True, allocations=False):
+        self.game_state = game_state
+        self.timers = timers
+        self.calls = {}
+        self.seconds = {}
+        self.moves_generated = {}
+        self.max_undo_depth = len(game_state.Undo_STack)
+        self.interned_at_start = len(MOVES)
+        self.started = time.perf_counter()
+        self.tracing_allocations = allocations and not tracemalloc.is_tracing()
+        self.allocation_totals = None  # (current, peak) bytes once tracing has stopped
+        if self.tracing_allocations:
+            tracemalloc.start()
+        self.wrap()
+
+    def wrap(self):
+        game_state = self.game_state
+        for name in list(GENERATORS.values()) + list(METHODS):
+            self.calls[name] = 0
+            self.seconds[name] = 0.0
+            self.moves_generated[name] = 0
+        if game_state.bitboard_generator is not None:
+            self.calls["bitboard"] = 0
+            self.seconds["bitboard"] = 0.0
+            self.moves_generated["bitboard"] = 0
+            generator = game_state.bitboard_generator
+            generator.get_valid_moves = self.counting(generator.get_valid_moves, "bitboard")
+
+        functions = list(game_state.type_move_functions)
+        for piece_type, name in GENERATORS.items():
+            functions[piece_type] = self.counting_generator(functions[piece_type], name)
+        game_state.type_move_functions = functions
+        game_state.get_king_moves = functions[KING]  # also called directly when in double check
+        for name, method in METHODS.items():
+            setattr(game_state, method, self.counting(getattr(game_state, method), name))
+
+        counted_apply = game_state.apply_move
+
+        def apply_move(move):
+            counted_apply(move)
+            if len(game_state.Undo_STack) > self.max_undo_depth:
+                self.max_undo_depth = len(game_state.Undo_STack)
+        game_state.apply_move = apply_move
+
+    def counting_generator(self, function, name):
+        calls, seconds, generated = self.calls, self.seconds, self.moves_generated
+        if not self.timers:
+            def generator(r, c, moves):
+                before = len(moves)
+                function(r, c, moves)
+                calls[name] += 1
+                generated[name] += len(moves) - before
+            return generator
+        clock = time.perf_counter
+
+        def timed_generator(r, c, moves):
+            before = len(moves)
+            start = clock()
+            function(r, c, moves)
+            seconds[name] += clock() - start
+            calls[name] += 1
+            generated[name] += len(moves) - before
+        return timed_generator
+
+    '''
+    Wraps a method that returns its moves as a list, or appends them to a list passed last
+    '''
+    def counting(self, function, name):
+        calls, seconds, generated = self.calls, self.seconds, self.moves_generated
+        clock = time.perf_counter
+        timers = self.timers
+
+        def counted(*args):
+            moves = args[-1] if args and type(args[-1]) is list else None
+            before = len(moves) if moves is not None else 0
+            if timers:
+                start = clock()
+                result = function(*args)
+                seconds[name] += clock() - start
+            else:
+                result = function(*args)
+            calls[name] += 1
+            if moves is not None:
+                generated[name] += len(moves) - before
+            elif type(result) is list:
+                generated[name] += len(result)
+            return result
+        return counted
+
+    '''
+    Puts the plain methods back on the GameState. The counters keep their values
+    '''
+    def remove(self):
+        game_state = self.game_state
+        for attribute in ["get_king_moves"] + list(METHODS.values()):
+            game_state.__dict__.pop(attribute, None)
+        game_state.type_move_functions = [None, game_state.get_pawn_moves, game_state.get_knight_moves,
+                                          game_state.get_bishop_moves, game_state.get_rook_moves,
+                                          game_state.get_queen_moves, game_state.get_king_moves]
+        if game_state.bitboard_generator is not None:
+            game_state.bitboard_generator.__dict__.pop("get_valid_moves", None)
+        if self.tracing_allocations:
+            self.allocation_totals = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.tracing_allocations = False
+
+    def reset(self):
+        for counters in (self.calls, self.moves_generated):
+            for name in counters:
+                counters[name] = 0
+        for name in self.seconds:
+            self.seconds[name] = 0.0
+        self.max_undo_depth = len(self.game_state.Undo_STack)
+        self.interned_at_start = len(MOVES)
+        self.started = time.perf_counter()
+        if self.tracing_allocations:
+            tracemalloc.reset_peak()
+
+    def undo_stack_bytes(self):
+        stack = self.game_state.Undo_STack
+        return sys.getsizeof(stack) + sum(sys.getsizeof(record) for record in stack) + \
+            sys.getsizeof(self.game_state.Move_Log)
+
+    '''
+    The counters as a plain dict (safe to JSON encode). Times are inclusive: get_valid_moves contains generate,
+    which contains the piece generators
+    '''
+    def snapshot(self):
+        game_state = self.game_state
+        counters = {name: {"calls": self.calls[name], "moves": self.moves_generated[name]} for name in self.calls}
+        if self.timers:
+            for name, counter in counters.items():
+                seconds = self.seconds[name]
+                counter["seconds"] = round(seconds, 6)
+                counter["us_per_call"] = round(seconds * 1e6 / counter["calls"], 3) if counter["calls"] else 0.0
+        snapshot = {
+            "seconds": round(time.perf_counter() - self.started, 6),
+            "counters": counters,
+            "undo_stack": {"depth": len(game_state.Undo_STack), "max_depth": self.max_undo_depth,
+                           "bytes": self.undo_stack_bytes()},
+            "moves_interned": len(MOVES) - self.interned_at_start,
+        }
+        if game_state.move_cache is not None:
+            snapshot["move_cache"] = {"hits": game_state.move_cache.hits, "misses": game_state.move_cache.misses,
+                                      "size": len(game_state.move_cache.entries)}
+        if self.tracing_allocations:
+            current, peak = tracemalloc.get_traced_memory()
+            snapshot["allocations"] = {"current_bytes": current, "peak_bytes": peak}
+        elif self.allocation_totals is not None:
+            snapshot["allocations"] = {"current_bytes": self.allocation_totals[0],
+                                       "peak_bytes": self.allocation_totals[1]}
+        return snapshot
+
+
+class StackSampler:
+    '''
+    Samples one thread's Python call stack every interval seconds from a background thread and counts the collapsed
+    stacks. Far cheaper than tracing every call, and the only way to get whole stacks for a flame graph
+    '''
+    def __init__(self, interval=0.001, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.stacks = {}
+        self.samples = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.switch_interval = None
+
+    def start(self):
+        # The sampler needs the GIL to look at the stack; hand it over at least as often as we sample
+        self.switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(self.interval, self.switch_interval))
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        sys.setswitchinterval(self.switch_interval)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append("%s (%s:%d)" % (code.co_name, code.co_filename.rsplit("/", 1)[-1], code.co_firstlineno))
+                frame = frame.f_back
+            if names:
+                stack = ";".join(reversed(names))
+                self.stacks[stack] = self.stacks.get(stack, 0) + 1
+                self.samples += 1
+
+    def write(self, output):
+        for stack, count in sorted(self.stacks.items()):
+            output.write("%s %d\n" % (stack, count))
+
+
+'''
+Profiles the code run inside the with block and writes the report to path when it ends. format is "pstats" (cProfile
+data), "text" (the pstats listing) or "collapsed" (sampled stacks, interval seconds apart)
+'''
+@contextlib.contextmanager
+def profile(path, format="pstats", interval=0.001):
+    if format not in FORMATS:
+        raise ValueError("Unknown profile format: " + str(format))
+    if format == "collapsed":
+        sampler = StackSampler(interval)
+        sampler.start()
+        try:
+            yield sampler
+        finally:
+            sampler.stop()
+            with open(path, "w") as output:
+                sampler.write(output)
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        if format == "pstats":
+            profiler.dump_stats(path)
+        else:
+            text = io.StringIO()
+            pstats.Stats(profiler, stream=text).sort_stats("cumulative").print_stats(40)
+            with open(path, "w") as output:
+                output.write(text.getvalue())
+
+
+def run_workload(args, game_state):
+    if args.pgn:
+        from Chess.pgn import read_games, san_to_move
+        games = plies = 0
+        for game in read_games(args.pgn):
+            game_state.set_fen(game.headers.get("FEN", START_FEN))
+            try:
+                for san in game.sans:
+                    game_state.apply_move(san_to_move(game_state, san))
+                    plies += 1
+            except ValueError:
+                pass
+            games += 1
+        return {"games": games, "plies": plies}
+    from Chess.perft import perft
+    return {"nodes": perft(game_state, args.perft)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Count and time move generation over a workload")
+    workload = parser.add_mutually_exclusive_group()
+    workload.add_argument("--perft", type=int, default=3, help="perft depth (the default workload)")
+    workload.add_argument("--pgn", help="replay the games of a PGN file instead")
+    parser.add_argument("--fen", default=START_FEN, help="perft start position")
+    parser.add_argument("--generator", default="mailbox", choices=("mailbox", "bitboard"))
+    parser.add_argument("--no-timers", action="store_true", help="count calls only")
+    parser.add_argument("--allocations", action="store_true", help="also trace allocated memory (slow)")
+    parser.add_argument("--profile", help="also write a profile of the workload to this file")
+    parser.add_argument("--format", default="pstats", choices=FORMATS)
+    args = parser.parse_args(argv)
+
+    game_state = GameState.from_fen(args.fen, args.generator)
+    stats = Instrumentation(game_state, timers=not args.no_timers, allocations=args.allocations)
+    with profile(args.profile, args.format) if args.profile else contextlib.nullcontext():
+        result = run_workload(args, game_state)
+    stats.remove()
+    json.dump(dict(result, **stats.snapshot()), sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
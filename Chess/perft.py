@@ -0,0 +1,119 @@
+"""
+Perft: counts the leaf nodes of the legal move tree to a fixed depth. The counts for the standard test positions are
+known exactly, so any difference points at a move generation bug (pins, checks, en passant, promotion, castling).
+
+    python -m Chess.perft --depth 4
+    python -m Chess.perft --position kiwipete --depth 3 --generator bitboard --divide
+    python -m Chess.perft --epd perftsuite.epd --depth 3
+
+An EPD suite gives the expected counts as ";D1 20 ;D2 400 ..." operations and is read one line at a time.
+
+Results are printed as JSON; the exit status is 1 if any count differs from the expected one.
+"""
+import argparse
+import json
+import sys
+import time
+
+from Chess.ChessEngine import GameState
+from Chess.epd import read_positions
+
+# name -> (FEN, expected node counts for depth 1, 2, ...)
+PERFT_POSITIONS = {
+    "startpos": ("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+                 (20, 400, 8902, 197281, 4865609, 119060324)),
+    "kiwipete": ("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+                 (48, 2039, 97862, 4085603, 193690690)),
+    "position3": ("8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+                  (14, 191, 2812, 43238, 674624, 11030083)),
+    "position4": ("r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+                  (6, 264, 9467, 422333, 15833292)),
+    "position5": ("rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+                  (44, 1486, 62379, 2103487, 89941194)),
+    "position6": ("r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+                  (46, 2079, 89890, 3894594, 164075551)),
+    # Pawns pinned along their own file, pushing toward their king
+    "pinned-push": ("4k3/8/8/8/4K3/8/4P3/4r3 w - - 0 1",
+                    (9, 118, 956, 16210)),
+    "pinned-push-black": ("5R2/1b5r/3N1p1p/3p3n/2P1Pk1q/BP5n/8/1K2b3 b - - 8 60",
+                          (35, 1000, 34304, 935746)),
+}
+
+
+def perft(game_state, depth):
+    if depth == 0:
+        return 1
+    moves = game_state.get_valid_moves() or []  # False means a king was captured
+    if depth == 1:
+        return len(moves)  # bulk counting: leaves don't need to be made
+    nodes = 0
+    for move in moves:
+        game_state.apply_move(move)
+        nodes += perft(game_state, depth - 1)
+        game_state.unmake_move()
+    return nodes
+
+
+'''
+Node counts below each root move, keyed by coordinate notation, for comparing against another engine
+'''
+def divide(game_state, depth):
+    counts = {}
+    for move in game_state.get_valid_moves() or []:
+        game_state.apply_move(move)
+        counts[move.get_chess_notation()] = perft(game_state, depth - 1)
+        game_state.unmake_move()
+    return counts
+
+
+def run_position(name, fen, expected, max_depth, generator="mailbox", show_divide=False):
+    game_state = GameState.from_fen(fen, generator)
+    result = {"name": name, "fen": fen, "generator": generator, "depths": []}
+    for depth in range(1, max_depth + 1):
+        start = time.perf_counter()
+        nodes = perft(game_state, depth)
+        seconds = time.perf_counter() - start
+        want = expected[depth - 1] if depth <= len(expected) else None
+        result["depths"].append({
+            "depth": depth,
+            "nodes": nodes,
+            "expected": want,
+            "ok": want is None or nodes == want,
+            "seconds": round(seconds, 6),
+            "nps": int(nodes / seconds) if seconds > 0 else None,
+        })
+    if show_divide:
+        result["divide"] = divide(game_state, max_depth)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run perft on the standard test positions")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--position", action="append", choices=sorted(PERFT_POSITIONS),
+                        help="position to run (repeatable, default: all)")
+    parser.add_argument("--generator", default="mailbox", choices=("mailbox", "bitboard"))
+    parser.add_argument("--divide", action="store_true", help="also report per-root-move counts at --depth")
+    parser.add_argument("--epd", help="run the positions of an EPD perft suite instead of the built-in ones")
+    args = parser.parse_args(argv)
+
+    results = []
+    if args.epd:
+        for number, (game_state, operations) in enumerate(read_positions(args.epd, args.generator), 1):
+            expected = []
+            while "D%d" % (len(expected) + 1) in operations:
+                expected.append(int(operations["D%d" % (len(expected) + 1)]))
+            depth = min(args.depth, len(expected)) if expected else args.depth
+            name = operations.get("id", "epd-%d" % number)
+            results.append(run_position(name, game_state.to_fen(), expected, depth, args.generator, args.divide))
+    for name in args.position or ([] if args.epd else list(PERFT_POSITIONS)):
+        fen, expected = PERFT_POSITIONS[name]
+        results.append(run_position(name, fen, expected, args.depth, args.generator, args.divide))
+    passed = all(entry["ok"] for result in results for entry in result["depths"])
+    json.dump({"passed": passed, "results": results}, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    return 0 if passed else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,304 @@
+"""
+Streaming PGN reader and replayer. Games are read from the archive one at a time, their SAN moves are resolved
+against GameState.get_valid_moves and replayed, so memory stays bounded by the largest single game however big the
+archive is:
+
+    for record in replay_games("archive.pgn"):
+        print(record.headers.get("Event"), record.plies, record.error)
+
+    python -m Chess.pgn archive.pgn --jsonl > games.jsonl
+
+Each game's moves are checked for legality, so this doubles as an archive validator.
+"""
+import argparse
+import json
+import re
+import sys
+import time
+
+from Chess.ChessEngine import GameState, Move
+
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+SAN_PATTERN = re.compile(r"^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$")
+TAG_PATTERN = re.compile(r'^\[(\w+)\s+"((?:[^"\\]|\\.)*)"\]')
+TOKEN_PATTERN = re.compile(r"\{[^}]*\}|;[^\n]*|\(|\)|\$\d+|[^\s(){};]+")
+COMMENT_START_PATTERN = re.compile(r"[{;]")
+MOVE_NUMBER_PATTERN = re.compile(r"^\d+\.+$|^\d+\.+(?=\S)")
+
+
+class PGNGame:
+    def __init__(self, headers, sans, result):
+        self.headers = headers
+        self.sans = sans
+        self.result = result
+
+
+class GameRecord:
+    '''
+    The outcome of replaying one game. error is None when every move was legal
+    '''
+    def __init__(self, number, headers, result, plies, final_fen, error):
+        self.number = number
+        self.headers = headers
+        self.result = result
+        self.plies = plies
+        self.final_fen = final_fen
+        self.error = error
+
+    def to_dict(self):
+        return {"game": self.number, "headers": self.headers, "result": self.result, "plies": self.plies,
+                "final_fen": self.final_fen, "error": self.error}
+
+
+class PositionRecord:
+    '''
+    One replayed position. game_state is shared and keeps changing, so read what you need before the next record
+    '''
+    def __init__(self, game_number, ply, san, move, game_state):
+        self.game_number = game_number
+        self.ply = ply
+        self.san = san
+        self.move = move
+        self.game_state = game_state
+
+
+class ReplayStats:
+    def __init__(self):
+        self.games = 0
+        self.positions = 0
+        self.errors = 0
+        self.start = time.perf_counter()
+
+    @property
+    def seconds(self):
+        return time.perf_counter() - self.start
+
+    @property
+    def games_per_second(self):
+        seconds = self.seconds
+        return self.games / seconds if seconds > 0 else 0.0
+
+    def to_dict(self):
+        return {"games": self.games, "positions": self.positions, "errors": self.errors,
+                "seconds": round(self.seconds, 3), "games_per_second": round(self.games_per_second, 1)}
+
+
+'''
+Yields a PGNGame for every game in a file path or an open text file, reading line by line
+'''
+def read_games(source):
+    if isinstance(source, str):
+        with open(source, encoding="utf-8", errors="replace") as lines:
+            yield from read_games(lines)
+        return
+    headers = {}
+    movetext = []
+    in_comment = False  # inside a { } comment that started on an earlier line
+    for line in source:
+        stripped = line.strip()
+        if stripped.startswith('[') and not in_comment:
+            if movetext:
+                yield parse_game(headers, "\n".join(movetext))
+                headers, movetext = {}, []
+            match = TAG_PATTERN.match(stripped)
+            if match:
+                headers[match.group(1)] = match.group(2).replace('\\"', '"').replace('\\\\', '\\')
+        elif stripped or movetext:
+            if stripped.startswith('%') and not in_comment:
+                continue  # escape line
+            movetext.append(line.rstrip('\n'))
+            in_comment = _ends_in_comment(line, in_comment)
+    if headers or any(text.strip() for text in movetext):
+        yield parse_game(headers, "\n".join(movetext))
+
+
+'''
+Whether a { } comment is still open at the end of a movetext line. Brace comments don't nest, so the first } closes
+one, and a { after a ; only belongs to that rest-of-line comment
+'''
+def _ends_in_comment(line, in_comment):
+    position = 0
+    while True:
+        if in_comment:
+            position = line.find('}', position)
+            if position == -1:
+                return True
+            position += 1
+            in_comment = False
+        else:
+            match = COMMENT_START_PATTERN.search(line, position)
+            if match is None or match.group() == ';':
+                return False
+            position = match.end()
+            in_comment = True
+
+
+'''
+Turns movetext into the main line SAN moves, dropping comments, variations, NAGs and move numbers
+'''
+def parse_game(headers, movetext):
+    sans = []
+    result = headers.get("Result", "*")
+    depth = 0
+    for token in TOKEN_PATTERN.findall(movetext):
+        if token == '(':
+            depth += 1
+        elif token == ')':
+            depth -= 1
+        elif depth > 0 or token[0] in '{;$':
+            continue
+        elif token in RESULTS:
+            result = token
+        else:
+            token = MOVE_NUMBER_PATTERN.sub("", token)
+            if token:
+                sans.append(token)
+    return PGNGame(headers, sans, result)
+
+
+'''
+Finds the legal move written as san in the current position, or raises ValueError
+'''
+def san_to_move(game_state, san, moves=None):
+    if moves is None:
+        moves = game_state.get_valid_moves() or []
+    text = san.rstrip("+#!?")
+    if text in ("O-O", "0-0", "O-O-O", "0-0-0"):
+        long_castle = len(text) == 5
+        for move in moves:
+            if move.is_castle_move and (move.endColumn < move.startColumn) == long_castle:
+                return move
+        raise ValueError("Illegal castling: " + san)
+
+    match = SAN_PATTERN.match(text)
+    if match is None:
+        raise ValueError("Unreadable SAN: " + san)
+    piece, from_file, from_rank, target, promotion = match.groups()
+    piece = piece or 'P'
+    end_row = Move.Ranks_To_Rows[target[1]]
+    end_column = Move.Files_To_Col[target[0]]
+    candidates = []
+    for move in moves:
+        if move.endRow != end_row or move.endColumn != end_column or move.pieceMoved[1] != piece:
+            continue
+        if from_file is not None and move.startColumn != Move.Files_To_Col[from_file]:
+            continue
+        if from_rank is not None and move.startRow != Move.Ranks_To_Rows[from_rank]:
+            continue
+        if move.is_pawn_promotion and move.promotion_choice != (promotion or 'Q'):
+            continue
+        candidates.append(move)
+    if len(candidates) != 1:
+        raise ValueError(("Ambiguous" if candidates else "Illegal") + " move: " + san)
+    return candidates[0]
+
+
+'''
+Standard algebraic notation for a legal move in the current position, with a "+" or "#" suffix
+'''
+def move_to_san(game_state, move, moves=None):
+    if moves is None:
+        moves = game_state.get_valid_moves() or []
+    piece = move.pieceMoved[1]
+    capture = move.pieceCaptured != '--' or move.enpassant_valid
+    target = move.get_rank_files(move.endRow, move.endColumn)
+    if move.is_castle_move:
+        san = "O-O" if move.endColumn > move.startColumn else "O-O-O"
+    elif piece == 'P':
+        san = (Move.Col_To_Files[move.startColumn] + 'x' if capture else "") + target
+        if move.is_pawn_promotion:
+            san += '=' + move.promotion_choice
+    else:
+        rivals = [other for other in moves if other.pieceMoved == move.pieceMoved and other.end == move.end and
+                  other.start != move.start]
+        disambiguation = ""
+        if rivals:
+            if all(other.startColumn != move.startColumn for other in rivals):
+                disambiguation = Move.Col_To_Files[move.startColumn]
+            elif all(other.startRow != move.startRow for other in rivals):
+                disambiguation = Move.Rows_To_Ranks[move.startRow]
+            else:
+                disambiguation = move.get_rank_files(move.startRow, move.startColumn)
+        san = piece + disambiguation + ('x' if capture else "") + target
+
+    game_state.apply_move(move)
+    replies = game_state.get_valid_moves()
+    if game_state.isCheck:
+        san += '#' if not replies else '+'
+    game_state.unmake_move()
+    return san
+
+
+def start_position(headers, generator="mailbox"):
+    if "FEN" in headers:
+        return GameState.from_fen(headers["FEN"], generator)
+    return GameState(generator)
+
+
+'''
+Replays every game and yields a GameRecord per game. stats, if given, is a ReplayStats updated as games go by
+'''
+def replay_games(source, generator="mailbox", stats=None):
+    for number, game in enumerate(read_games(source), 1):
+        error = None
+        plies = 0
+        try:
+            game_state = start_position(game.headers, generator)
+            for san in game.sans:
+                game_state.apply_move(san_to_move(game_state, san))
+                plies += 1
+            final_fen = game_state.to_fen()
+        except (ValueError, KeyError) as exc:  # an illegal move, or a bad FEN header
+            error = "ply %d: %s" % (plies + 1, exc)
+            final_fen = None
+        if stats is not None:
+            stats.games += 1
+            stats.positions += plies
+            stats.errors += error is not None
+        yield GameRecord(number, game.headers, game.result, plies, final_fen, error)
+
+
+'''
+Yields a PositionRecord after every move of every game. Games with an illegal move stop at that move
+'''
+def replay_positions(source, generator="mailbox", stats=None):
+    for number, game in enumerate(read_games(source), 1):
+        try:
+            game_state = start_position(game.headers, generator)
+            for ply, san in enumerate(game.sans, 1):
+                move = san_to_move(game_state, san)
+                game_state.apply_move(move)
+                if stats is not None:
+                    stats.positions += 1
+                yield PositionRecord(number, ply, san, move, game_state)
+        except (ValueError, KeyError):
+            if stats is not None:
+                stats.errors += 1
+        if stats is not None:
+            stats.games += 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Validate and replay a PGN archive")
+    parser.add_argument("pgn")
+    parser.add_argument("--limit", type=int, help="stop after this many games")
+    parser.add_argument("--jsonl", action="store_true", help="print one JSON record per game")
+    parser.add_argument("--generator", default="mailbox", choices=("mailbox", "bitboard"))
+    args = parser.parse_args(argv)
+
+    stats = ReplayStats()
+    for record in replay_games(args.pgn, args.generator, stats):
+        if args.jsonl:
+            sys.stdout.write(json.dumps(record.to_dict()) + "\n")
+        if args.limit is not None and stats.games >= args.limit:
+            break
+    summary = json.dumps(stats.to_dict())
+    if args.jsonl:
+        sys.stderr.write(summary + "\n")
+    else:
+        sys.stdout.write(summary + "\n")
+    return 1 if stats.errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,335 @@
+"""
+Alpha-beta search on top of GameState: negamax with iterative deepening under a depth, time or node budget, a bounded
+transposition table keyed by the zobrist key, MVV-LVA capture ordering and a quiescence search over captures. Leaves
+are scored by Chess.evaluation. Given an opening book (Chess.book), a book move is played without searching; given
+endgame tablebases (Chess.tablebase), positions they cover are scored exactly and the root plays their best move.
+
+    searcher = Searcher()
+    result = searcher.search(game_state, time_limit=1.0)
+    game_state.make_move(result.best_move)
+"""
+import time
+
+from Chess.ChessEngine import PIECE_TYPE_MASK, QUEEN, ENPASSANT_FLAG, MOVED_SHIFT, CAPTURED_SHIFT, PROMOTION_SHIFT, \
+    FIFTY_MOVE_PLIES
+from Chess.evaluation import evaluate
+from Chess.tablebase import WIN, LOSS, piece_total
+
+MATE_SCORE = 100000
+MATE_BOUND = MATE_SCORE - 1000  # scores beyond this are mates, stored in the table relative to the node
+INFINITY = MATE_SCORE + 1
+MAX_DEPTH = 64
+
+# Centipawn values by piece type code (index 0 is empty), for move ordering
+PIECE_VALUES = (0, 100, 320, 330, 500, 900, 20000)
+CAPTURE_BITS = 31 << CAPTURED_SHIFT | ENPASSANT_FLAG
+
+EXACT, LOWER_BOUND, UPPER_BOUND = 0, 1, 2
+
+
+class SearchStopped(Exception):
+    pass
+
+
+'''
+Most valuable victim, least valuable attacker. En passant captures a pawn even though the target square is empty
+'''
+def mvv_lva(move):
+    code = move.code
+    if code & ENPASSANT_FLAG:
+        return 1000 + 1000 - 1
+    victim = PIECE_VALUES[code >> CAPTURED_SHIFT & PIECE_TYPE_MASK]
+    if victim == 0:
+        return PIECE_VALUES[code >> PROMOTION_SHIFT & PIECE_TYPE_MASK]  # queen promotions first, then the rest
+    return 1000 + victim * 10 - PIECE_VALUES[code >> MOVED_SHIFT & PIECE_TYPE_MASK] // 100
+
+
+def is_capture(move):
+    return move.code & CAPTURE_BITS != 0
+
+
+class TranspositionTable:
+    '''
+    Fixed number of slots (rounded down to a power of two) indexed by the low bits of the zobrist key. A slot is
+    replaced when it is empty, holds the same position, was written by an older search, or searched less deep
+    '''
+    def __init__(self, size=1 << 18):
+        slots = 1
+        while slots * 2 <= size:
+            slots *= 2
+        self.mask = slots - 1
+        self.slots = [None] * slots
+        self.generation = 0
+        self.used = 0
+
+    def new_search(self):
+        self.generation = (self.generation + 1) & 0xFF
+
+    def clear(self):
+        self.slots = [None] * len(self.slots)
+        self.used = 0
+
+    def probe(self, key):
+        entry = self.slots[key & self.mask]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def store(self, key, depth, score, flag, move):
+        index = key & self.mask
+        entry = self.slots[index]
+        if entry is None:
+            self.used += 1
+        elif entry[0] != key and entry[5] == self.generation and entry[1] > depth:
+            return
+        self.slots[index] = (key, depth, score, flag, move, self.generation)
+
+    '''
+    Occupied slots per thousand, as reported by UCI "hashfull"
+    '''
+    def hashfull(self):
+        return self.used * 1000 // len(self.slots)
+
+
+class SearchResult:
+    def __init__(self, best_move, score, pv, depth, nodes, seconds):
+        self.best_move = best_move
+        self.score = score
+        self.pv = pv
+        self.depth = depth
+        self.nodes = nodes
+        self.seconds = seconds
+        self.nps = int(nodes / seconds) if seconds > 0 else 0
+
+    def is_mate_score(self):
+        return abs(self.score) > MATE_BOUND
+
+    def __repr__(self):
+        pv = ' '.join(move.get_chess_notation() for move in self.pv)
+        return "SearchResult(depth=%d, score=%d, nodes=%d, nps=%d, pv=%s)" % (
+            self.depth, self.score, self.nodes, self.nps, pv)
+
+
+class Searcher:
+    '''
+    on_iteration, if given, is called with a SearchResult after every completed depth. book is an OpeningBook
+    consulted before searching and tablebases a Tablebases probed during it
+    '''
+    def __init__(self, table=None, on_iteration=None, book=None, tablebases=None):
+        self.table = table if table is not None else TranspositionTable()
+        self.on_iteration = on_iteration
+        self.book = book
+        self.tablebases = tablebases
+        self.stopped = False
+        self.nodes = 0
+        self.deadline = None
+        self.node_limit = None
+        self.root_best_move = None
+
+    '''
+    Asks a running search (possibly in another thread) to return its last completed result as soon as possible
+    '''
+    def stop(self):
+        self.stopped = True
+
+    def search(self, game_state, max_depth=MAX_DEPTH, time_limit=None, node_limit=None):
+        start = time.perf_counter()
+        self.stopped = False
+        self.nodes = 0
+        self.deadline = start + time_limit if time_limit is not None else None
+        self.node_limit = node_limit
+        self.table.new_search()
+        root_moves = game_state.get_valid_moves() or []
+        root_ply = len(game_state.Move_Log)
+        result = SearchResult(root_moves[0] if root_moves else None, 0, root_moves[:1], 0, 0, 0.0)
+        if len(root_moves) <= 1:
+            return result
+        if self.book is not None:
+            book_move = self.book.choose_move(game_state)
+            if book_move is not None:
+                return SearchResult(book_move, 0, [book_move], 0, 0, time.perf_counter() - start)
+        if self.tablebases is not None and piece_total(game_state) <= self.tablebases.max_pieces:
+            found = self.tablebases.best_move(game_state)
+            if found is not None:
+                return SearchResult(found[0], tablebase_score(found[1], 0), [found[0]], 0, 0,
+                                    time.perf_counter() - start)
+
+        for depth in range(1, max_depth + 1):
+            try:
+                score = self.negamax(game_state, depth, -INFINITY, INFINITY, 0)
+            except SearchStopped:
+                while len(game_state.Move_Log) > root_ply:
+                    game_state.unmake_move()
+                break
+            best_move = self.root_best_move
+            pv = self.principal_variation(game_state, depth)
+            if not pv or pv[0] != best_move:
+                pv = [best_move]
+            result = SearchResult(best_move, score, pv, depth, self.nodes, time.perf_counter() - start)
+            if self.on_iteration is not None:
+                self.on_iteration(result)
+            if abs(score) > MATE_BOUND or self.stopped:
+                break
+            # Another iteration takes several times longer than this one; don't start what can't finish
+            if self.deadline is not None and time.perf_counter() - start > (self.deadline - start) / 2:
+                break
+        result.nodes = self.nodes
+        result.seconds = time.perf_counter() - start
+        result.nps = int(result.nodes / result.seconds) if result.seconds > 0 else 0
+        return result
+
+    def check_limits(self):
+        if self.stopped or (self.deadline is not None and time.perf_counter() >= self.deadline) or \
+                (self.node_limit is not None and self.nodes >= self.node_limit):
+            self.stopped = True
+            raise SearchStopped()
+
+    def negamax(self, game_state, depth, alpha, beta, ply):
+        self.nodes += 1
+        if self.nodes & 1023 == 0 or self.stopped:
+            self.check_limits()
+        # A repetition inside the search is scored as the draw it can be forced into
+        if ply > 0 and (game_state.repetition_count() >= 2 or game_state.halfmove_clock >= FIFTY_MOVE_PLIES or
+                        game_state.is_insufficient_material()):
+            return 0
+        if ply > 0 and self.tablebases is not None and piece_total(game_state) <= self.tablebases.max_pieces:
+            result = self.tablebases.probe(game_state)
+            if result is not None:
+                return tablebase_score(result, ply)
+        if depth <= 0:
+            return self.quiescence(game_state, alpha, beta, ply)
+
+        key = game_state.zobrist_key
+        table_move = None
+        entry = self.table.probe(key)
+        if entry is not None:
+            table_move = entry[4]
+            if entry[1] >= depth and ply > 0:
+                score = score_from_table(entry[2], ply)
+                flag = entry[3]
+                if flag == EXACT or (flag == LOWER_BOUND and score >= beta) or \
+                        (flag == UPPER_BOUND and score <= alpha):
+                    return score
+
+        moves = game_state.get_valid_moves()
+        if moves is False:
+            return -MATE_SCORE + ply  # our king has been captured
+        if not moves:
+            return -MATE_SCORE + ply if game_state.isCheck else 0
+        order_moves(moves, table_move)
+
+        original_alpha = alpha
+        best_score = -INFINITY
+        best_move = None
+        for move in moves:
+            game_state.apply_move(move)
+            score = -self.negamax(game_state, depth - 1, -beta, -alpha, ply + 1)
+            game_state.unmake_move()
+            if score > best_score:
+                best_score = score
+                best_move = move
+                if ply == 0:
+                    self.root_best_move = move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+
+        if best_score <= original_alpha:
+            flag = UPPER_BOUND
+        elif best_score >= beta:
+            flag = LOWER_BOUND
+        else:
+            flag = EXACT
+        self.table.store(key, depth, score_to_table(best_score, ply), flag, best_move)
+        return best_score
+
+    def quiescence(self, game_state, alpha, beta, ply):
+        moves = game_state.get_valid_moves()
+        if moves is False:
+            return -MATE_SCORE + ply
+        if not moves:
+            return -MATE_SCORE + ply if game_state.isCheck else 0
+        if game_state.isCheck:
+            captures = moves  # no standing pat in check: every evasion is searched
+        else:
+            stand_pat = evaluate(game_state)
+            if stand_pat >= beta:
+                return stand_pat
+            if stand_pat > alpha:
+                alpha = stand_pat
+            captures = [move for move in moves
+                        if move.code & CAPTURE_BITS or move.code >> PROMOTION_SHIFT & PIECE_TYPE_MASK == QUEEN]
+        captures.sort(key=mvv_lva, reverse=True)
+        for move in captures:
+            self.nodes += 1
+            if self.nodes & 1023 == 0 or self.stopped:
+                self.check_limits()
+            game_state.apply_move(move)
+            score = -self.quiescence(game_state, -beta, -alpha, ply + 1)
+            game_state.unmake_move()
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+        return alpha
+
+    '''
+    Follows best moves stored in the transposition table from the current position
+    '''
+    def principal_variation(self, game_state, depth):
+        pv = []
+        seen = set()
+        while len(pv) < depth and game_state.zobrist_key not in seen:
+            seen.add(game_state.zobrist_key)
+            entry = self.table.probe(game_state.zobrist_key)
+            if entry is None or entry[4] is None:
+                break
+            moves = game_state.get_valid_moves() or []
+            if entry[4] not in moves:
+                break
+            pv.append(entry[4])
+            game_state.apply_move(entry[4])
+        for _ in pv:
+            game_state.unmake_move()
+        return pv
+
+
+'''
+Table move first, then captures and promotions by MVV-LVA, then quiet moves in generation order
+'''
+def order_moves(moves, table_move):
+    moves.sort(key=mvv_lva, reverse=True)
+    if table_move is not None:
+        for i in range(len(moves)):
+            if moves[i].code == table_move.code:
+                moves.insert(0, moves.pop(i))
+                break
+
+
+'''
+A tablebase result as a search score: mate scores counted from the root, 0 for a draw
+'''
+def tablebase_score(result, ply):
+    outcome, plies = result
+    if outcome == WIN:
+        return MATE_SCORE - ply - plies
+    if outcome == LOSS:
+        return -MATE_SCORE + ply + plies
+    return 0
+
+
+def score_to_table(score, ply):
+    if score > MATE_BOUND:
+        return score + ply
+    if score < -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def score_from_table(score, ply):
+    if score > MATE_BOUND:
+        return score - ply
+    if score < -MATE_BOUND:
+        return score + ply
+    return score
@@ -0,0 +1,67 @@
+"""
+Startup cost of the two ways in: importing the engine headless (what servers, UCI and batch jobs pay) and launching
+the GUI up to its first drawn frame. Every run is a fresh interpreter, and the bare interpreter startup is reported
+alongside so it can be subtracted:
+
+    python -m Chess.startup_benchmark --runs 10
+
+The GUI run uses SDL's dummy video driver, so it works without a display. Results are printed as JSON.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEADLESS = """
+import sys
+import Chess.ChessEngine
+assert 'pygame' not in sys.modules, 'the engine imported pygame'
+"""
+
+GUI = """
+import pygame as p
+from Chess import ChessEngine, ChessMain
+p.init()
+screen = p.display.set_mode((ChessMain.Width, ChessMain.Height))
+game_state = ChessEngine.GameState()
+renderer = ChessMain.BoardRenderer(screen, ChessMain.SQ_Size)
+renderer.draw(game_state, game_state.get_valid_moves(), (), None)
+"""
+
+SCRIPTS = {"interpreter": "pass", "headless_import": HEADLESS, "gui_first_frame": GUI}
+
+
+def time_script(script, runs):
+    env = dict(os.environ, SDL_VIDEODRIVER="dummy", SDL_AUDIODRIVER="dummy", PYGAME_HIDE_SUPPORT_PROMPT="1")
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        completed = subprocess.run([sys.executable, "-c", script], cwd=PACKAGE_ROOT, env=env,
+                                   capture_output=True, text=True)
+        seconds = time.perf_counter() - start
+        if completed.returncode != 0:
+            lines = completed.stderr.strip().splitlines()
+            return {"error": lines[-1] if lines else "exit status %d" % completed.returncode}
+        times.append(seconds)
+    return {"median_ms": round(statistics.median(times) * 1000, 1), "min_ms": round(min(times) * 1000, 1),
+            "runs": runs}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure headless import and GUI launch time")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    results = {name: time_script(script, args.runs) for name, script in SCRIPTS.items()}
+    json.dump(results, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    return 1 if any("error" in result for result in results.values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,656 @@
+"""
+Endgame tablebases for 3 and 4 pieces, generated by retrograde analysis with GameState's own move rules. Each table
+(KQvK, KRvKP, ...) stores one byte per position: 0 for a draw, 255 for an unreachable position, otherwise the distance
+to mate in plies plus one, so it is even when the side to move wins (an odd number of plies to mate) and odd when it
+loses. Files are a 16-byte header and that byte array, indexed directly from the piece squares, so a probe is one read
+from the memory-mapped file:
+
+    python -m Chess.tablebase --dir tablebases             # every 3-piece table
+    python -m Chess.tablebase --dir tablebases KQvKR KRPvK  # these, and the smaller tables they need
+
+    tablebases = Tablebases("tablebases")
+    tablebases.probe(game_state)  # (WIN/DRAW/LOSS for the side to move, plies to mate) or None
+
+Generation plays every legal move of every position once, across worker processes, records the moves that stay in
+the table and scores the captures and promotions that leave it from the smaller tables. Results then spread back
+from the mates one ply at a time. The stronger side is stored as white; positions with the colours reversed are
+probed mirrored. The white king is confined to a 10-square triangle in pawnless tables and to the a-d files with
+pawns, which cuts the tables to 1/6 and 1/2 of the plain size. Castling and en passant are not indexed: positions
+with castling rights aren't probed, and an en passant capture is looked up one move on, both when generating and when
+probing.
+"""
+import argparse
+import json
+import mmap
+import os
+import sys
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from Chess.ChessEngine import GameState, WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, PIECE_NAMES, \
+    BOARD_SQUARES, CAPTURED_SHIFT, ENPASSANT_FLAG, PROMOTION_SHIFT, PIECE_TYPE_MASK, MOVED_SHIFT
+
+WIN, DRAW, LOSS = 1, 0, -1
+DRAW_VALUE = 0
+ILLEGAL_VALUE = 255
+MAX_PLIES = 253
+HEADER_SIZE = 16
+MAGIC = b"CHTB"
+VERSION = 1
+EXTENSION = ".tb"
+DEFAULT_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tablebases")
+
+PIECE_ORDER = "QRBNP"  # order of the non-king pieces of a side in table names and indexes
+PIECE_TYPES = {'K': KING, 'Q': QUEEN, 'R': ROOK, 'B': BISHOP, 'N': KNIGHT, 'P': PAWN}
+PIECE_LETTERS = {piece_type: letter for letter, piece_type in PIECE_TYPES.items()}
+PIECE_WORTH = {'K': 0, 'Q': 9, 'R': 5, 'B': 3, 'N': 3, 'P': 1}
+EXIT_BITS = 31 << CAPTURED_SHIFT | ENPASSANT_FLAG | PIECE_TYPE_MASK << PROMOTION_SHIFT  # moves that change material
+
+# White king squares (r * 8 + c) the indexes start from
+TRIANGLE_SLOTS = [r * 8 + c for r in range(4) for c in range(r, 4)]
+HALF_BOARD_SLOTS = [r * 8 + c for r in range(8) for c in range(4)]
+
+# Per-position kinds reported by the workers
+NORMAL, UNREACHABLE, MATED, STALEMATE = 0, 1, 2, 3
+NO_EXIT = 255
+VIRTUAL_CHILD = 1 << 31  # marks a child that is one of a chunk's en passant nodes, see generate_chunk
+
+# Per-process state, built on the first chunk a worker runs
+_worker_state = {}
+
+
+'''
+The name of the table holding a material balance, and whether the colours are swapped in it. white and black are
+piece letters such as "KRP"
+'''
+def table_name(white, black):
+    white = "K" + "".join(sorted(white.replace("K", ""), key=PIECE_ORDER.index))
+    black = "K" + "".join(sorted(black.replace("K", ""), key=PIECE_ORDER.index))
+    if _strength(black) > _strength(white):
+        return black + "v" + white, True
+    return white + "v" + black, False
+
+
+def _strength(pieces):
+    return sum(PIECE_WORTH[letter] for letter in pieces), len(pieces), [-PIECE_ORDER.index(p) for p in pieces[1:]]
+
+
+def all_table_names(pieces):
+    names = set()
+    extras = [a + b for i, a in enumerate(PIECE_ORDER) for b in PIECE_ORDER[i:]] if pieces == 4 else PIECE_ORDER
+    for extra in extras:
+        names.add(table_name("K" + extra, "K")[0])
+    if pieces == 4:
+        for a in PIECE_ORDER:
+            for b in PIECE_ORDER:
+                names.add(table_name("K" + a, "K" + b)[0])
+    return sorted(names, key=lambda name: (len(name), name))
+
+
+'''
+The tables a table's captures and promotions lead into
+'''
+def dependencies(name):
+    white, black = name.split("v")
+    found = set()
+    for side, other, flip in ((white, black, False), (black, white, True)):
+        for i, letter in enumerate(side):
+            if letter == "K":
+                continue
+            rest = side[:i] + side[i + 1:]
+            found.add(table_name(*((other, rest) if flip else (rest, other)))[0])  # captured by the other side
+            if letter == "P":
+                for promoted in "QRBN":
+                    promoted_side = rest + promoted
+                    found.add(table_name(*((other, promoted_side) if flip else (promoted_side, other)))[0])
+    found.discard("KvK")
+    return sorted(found, key=lambda name: (len(name), name))
+
+
+def mirror_file(sq):
+    return sq ^ 7
+
+
+def mirror_rank(sq):
+    return sq ^ 56
+
+
+def transpose(sq):
+    return (sq & 7) * 8 + (sq >> 3)
+
+
+class TableSpec:
+    '''
+    Piece layout and index arithmetic of one table. squares lists the r * 8 + c square of every piece in the order
+    of pieces: white king, white's other pieces, black king, black's other pieces
+    '''
+    def __init__(self, name):
+        white, black = name.split("v")
+        self.name = name
+        self.pieces = [WHITE | PIECE_TYPES[letter] for letter in white] + \
+                      [BLACK | PIECE_TYPES[letter] for letter in black]
+        self.black_king = len(white)
+        self.has_pawns = "P" in name
+        self.slots = HALF_BOARD_SLOTS if self.has_pawns else TRIANGLE_SLOTS
+        self.slot_index = {sq: i for i, sq in enumerate(self.slots)}
+        self.positions = len(self.slots) * 64 ** (len(self.pieces) - 1)
+        self.size = self.positions * 2
+
+    def canonical(self, squares):
+        r, c = divmod(squares[0], 8)
+        if c > 3:
+            squares = [mirror_file(sq) for sq in squares]
+        if not self.has_pawns:
+            if r > 3:
+                squares = [mirror_rank(sq) for sq in squares]
+                r = 7 - r
+            if r > (squares[0] & 7):
+                squares = [transpose(sq) for sq in squares]
+        return squares
+
+    def index(self, squares, white_to_move):
+        squares = self.canonical(squares)
+        position = self.slot_index[squares[0]]
+        for sq in squares[1:]:
+            position = position * 64 + sq
+        return position * 2 + (0 if white_to_move else 1)
+
+    def decode(self, index):
+        position = index >> 1
+        squares = []
+        for _ in range(len(self.pieces) - 1):
+            position, sq = divmod(position, 64)
+            squares.append(sq)
+        squares.append(self.slots[position])
+        squares.reverse()
+        return squares, index & 1 == 0
+
+    '''
+    False for overlapping pieces, touching kings and pawns on the first or last rank
+    '''
+    def is_valid_placement(self, squares):
+        if len(set(squares)) != len(squares):
+            return False
+        white_king, black_king = squares[0], squares[self.black_king]
+        if abs((white_king >> 3) - (black_king >> 3)) <= 1 and abs((white_king & 7) - (black_king & 7)) <= 1:
+            return False
+        for piece, sq in zip(self.pieces, squares):
+            if piece & PIECE_TYPE_MASK == PAWN and sq >> 3 in (0, 7):
+                return False
+        return True
+
+
+def decode_value(value):
+    if value == DRAW_VALUE:
+        return DRAW, 0
+    plies = value - 1
+    return (WIN if plies & 1 else LOSS), plies
+
+
+class Table:
+    '''
+    One memory-mapped table file
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.data[:4] != MAGIC or self.data[4] != VERSION:
+            self.close()
+            raise ValueError(path + " is not a tablebase file")
+        self.name = self.data[8:16].rstrip(b"\0").decode("ascii")
+        self.spec = TableSpec(self.name)
+        if len(self.data) != HEADER_SIZE + self.spec.size:
+            self.close()
+            raise ValueError(path + " has the wrong size for " + self.name)
+
+    def value(self, index):
+        return self.data[HEADER_SIZE + index]
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+
+'''
+Pieces on the board, or None past 4 pieces, as (white pieces, black pieces) lists of (letter, r * 8 + c square)
+'''
+def material(game_state):
+    if sum(game_state.piece_counts[1:]) > 4:
+        return None
+    white, black = [], []
+    mailbox = game_state.mailbox
+    for square, sq in enumerate(BOARD_SQUARES):
+        piece = mailbox[sq]
+        if piece:
+            (white if piece & WHITE else black).append((PIECE_LETTERS[piece & PIECE_TYPE_MASK], square))
+    return white, black
+
+
+def piece_total(game_state):
+    return sum(game_state.piece_counts[1:])
+
+
+class Tablebases:
+    '''
+    The tables in a directory, opened as they are first probed
+    '''
+    def __init__(self, directory=DEFAULT_DIRECTORY):
+        self.directory = directory
+        self.tables = {}
+        names = [file[:-len(EXTENSION)] for file in os.listdir(directory) if file.endswith(EXTENSION)] \
+            if os.path.isdir(directory) else []
+        self.available = set(names)
+        self.max_pieces = max((len(name) - 1 for name in names), default=2)
+
+    def table(self, name):
+        if name not in self.tables:
+            path = os.path.join(self.directory, name + EXTENSION)
+            self.tables[name] = Table(path) if name in self.available else None
+        return self.tables[name]
+
+    def close(self):
+        for table in self.tables.values():
+            if table is not None:
+                table.close()
+        self.tables = {}
+
+    '''
+    (WIN, DRAW or LOSS for the side to move, plies to mate) of a position, or None if there's no table for it
+    '''
+    def probe(self, game_state):
+        if game_state.castle_rights:
+            return None
+        if game_state.enpassant_move:
+            return self.probe_enpassant(game_state)
+        return self.probe_position(game_state)
+
+    '''
+    The tables don't index the en passant square, so a position with one is the stored position plus the en passant
+    captures, which are probed one move on
+    '''
+    def probe_enpassant(self, game_state):
+        enpassant = game_state.enpassant_move
+        game_state.enpassant_move = ()
+        best = self.probe_position(game_state)
+        game_state.enpassant_move = enpassant
+        if best is None:
+            return None
+        for move in game_state.get_valid_moves() or []:
+            if move.code & ENPASSANT_FLAG:
+                game_state.apply_move(move)
+                result = self.probe_position(game_state)
+                game_state.unmake_move()
+                if result is None:
+                    return None
+                outcome, plies = -result[0], result[1] + 1 if result[0] != DRAW else 0
+                if _rank((outcome, plies)) > _rank(best):
+                    best = (outcome, plies)
+        return best
+
+    def probe_position(self, game_state):
+        pieces = material(game_state)
+        if pieces is None:
+            return None
+        white, black = pieces
+        white.sort(key=_piece_order)
+        black.sort(key=_piece_order)
+        name, flipped = table_name("".join(p[0] for p in white), "".join(p[0] for p in black))
+        if name == "KvK":
+            return DRAW, 0
+        table = self.table(name)
+        if table is None:
+            return None
+        if flipped:
+            squares = [mirror_rank(sq) for _, sq in black] + [mirror_rank(sq) for _, sq in white]
+            white_to_move = not game_state.White_To_Move
+        else:
+            squares = [sq for _, sq in white] + [sq for _, sq in black]
+            white_to_move = game_state.White_To_Move
+        value = table.value(table.spec.index(squares, white_to_move))
+        if value == ILLEGAL_VALUE:
+            return None
+        return decode_value(value)
+
+    '''
+    The legal move that keeps the best result (the quickest win, or the slowest loss) and its probe, or None
+    '''
+    def best_move(self, game_state):
+        best = None
+        for move in game_state.get_valid_moves() or []:
+            game_state.apply_move(move)
+            result = self.probe(game_state)
+            game_state.unmake_move()
+            if result is None:
+                return None
+            outcome, plies = result
+            rank = (-outcome, plies if outcome == WIN else -plies)  # from our side: their loss is our win
+            if best is None or rank > best[0]:
+                best = (rank, move, (-outcome, plies + 1 if outcome != DRAW else 0))
+        return None if best is None else (best[1], best[2])
+
+
+'''
+Sort key of a (outcome, plies) probe from the side to move's view: quicker wins first, slower losses before quicker ones
+'''
+def _rank(result):
+    outcome, plies = result
+    return outcome, plies if outcome == LOSS else -plies
+
+
+def _piece_order(piece):
+    return -1 if piece[0] == "K" else PIECE_ORDER.index(piece[0])
+
+
+'''
+The tables in DEFAULT_DIRECTORY, if it exists
+'''
+def open_default_tablebases():
+    if os.path.isdir(DEFAULT_DIRECTORY):
+        return Tablebases(DEFAULT_DIRECTORY)
+    return None
+
+
+'''
+Plays every move of the positions start..stop-1 of a table in a worker. Moves that stay in the table are returned as
+child indexes; captures and promotions are probed in the smaller tables and folded into the quickest win, the slowest
+loss and whether a draw is available.
+
+A double push beside an enemy pawn leads to a position the table can't index, since it has an en passant capture
+available. Such a child is expanded here into an extra node, numbered after the chunk's own positions and referred to
+as VIRTUAL_CHILD | number, with its moves played like any other position's
+'''
+def generate_chunk(name, directory, start, stop):
+    game_state = _worker_state.get("game_state")
+    if game_state is None:
+        game_state = _worker_state["game_state"] = GameState()
+    tablebases = _worker_state.get(directory)
+    if tablebases is None:
+        tablebases = _worker_state[directory] = Tablebases(directory)
+    spec = TableSpec(name)
+    count = stop - start
+    kinds = bytearray(count)
+    win_exits = bytearray([NO_EXIT]) * count
+    loss_exits = bytearray([NO_EXIT]) * count
+    draw_exits = bytearray(count)
+    child_counts = array('H', bytes(2 * count))
+    children = array('I')
+    extra = (bytearray(), bytearray(), bytearray(), bytearray(), array('H'), array('I'))  # en passant nodes
+    board = [["--"] * 8 for _ in range(8)]
+    game_state.castle_rights = 0
+    game_state.enpassant_move = ()
+
+    # Plays moves from the position squares, returning (win exit, loss exit, draw exit, child indexes)
+    def expand(squares, white_to_move, moves):
+        win_exit = loss_exit = NO_EXIT
+        draw_exit = 0
+        indexes = []
+        for move in moves:
+            code = move.code
+            if code & EXIT_BITS:
+                game_state.apply_move(move)
+                result = tablebases.probe(game_state)
+                game_state.unmake_move()
+                if result is None:
+                    raise ValueError("%s needs a table that hasn't been generated (after %s)" % (
+                        name, move.get_chess_notation()))
+                outcome, plies = result
+                if outcome == LOSS:
+                    win_exit = min(win_exit, plies + 1)
+                elif outcome == WIN:
+                    loss_exit = plies + 1 if loss_exit == NO_EXIT else max(loss_exit, plies + 1)
+                else:
+                    draw_exit = 1
+                continue
+            child = list(squares)
+            child[child.index(code & 63)] = code >> 6 & 63
+            if code >> MOVED_SHIFT & PIECE_TYPE_MASK == PAWN and abs((code >> 6 & 63) - (code & 63)) == 16:
+                game_state.apply_move(move)
+                if game_state.enpassant_move:
+                    indexes.append(VIRTUAL_CHILD | expand_enpassant(child, not white_to_move))
+                    game_state.unmake_move()
+                    continue
+                game_state.unmake_move()
+            indexes.append(spec.index(child, not white_to_move))
+        return win_exit, loss_exit, draw_exit, indexes
+
+    # Adds the position game_state is in (just after a double push) as an extra node and returns its number
+    def expand_enpassant(squares, white_to_move):
+        moves = game_state.get_valid_moves() or []
+        if moves:
+            kind = NORMAL
+            win_exit, loss_exit, draw_exit, indexes = expand(squares, white_to_move, moves)
+        else:
+            kind = MATED if game_state.isCheck else STALEMATE
+            win_exit, loss_exit, draw_exit, indexes = NO_EXIT, NO_EXIT, 0, []
+        extra_kinds, extra_wins, extra_losses, extra_draws, extra_counts, extra_children = extra
+        extra_kinds.append(kind)
+        extra_wins.append(win_exit)
+        extra_losses.append(loss_exit)
+        extra_draws.append(draw_exit)
+        extra_counts.append(len(indexes))
+        extra_children.extend(indexes)
+        return len(extra_kinds) - 1
+
+    for offset in range(count):
+        squares, white_to_move = spec.decode(start + offset)
+        if not spec.is_valid_placement(squares):
+            kinds[offset] = UNREACHABLE
+            continue
+        for piece, sq in zip(spec.pieces, squares):
+            board[sq >> 3][sq & 7] = PIECE_NAMES[piece]
+        game_state.White_To_Move = white_to_move
+        game_state.set_board(board)
+        for sq in squares:
+            board[sq >> 3][sq & 7] = "--"
+        # The side that just moved can't be left in check
+        king = game_state.black_king_square if white_to_move else game_state.white_king_square
+        if game_state.square_attacked(king, WHITE if white_to_move else BLACK):
+            kinds[offset] = UNREACHABLE
+            continue
+
+        moves = game_state.get_valid_moves() or []
+        if not moves:
+            kinds[offset] = MATED if game_state.isCheck else STALEMATE
+            continue
+        win_exits[offset], loss_exits[offset], draw_exits[offset], indexes = expand(squares, white_to_move, moves)
+        child_counts[offset] = len(indexes)
+        children.extend(indexes)
+    return (start, kinds, win_exits, loss_exits, draw_exits, child_counts, children) + extra
+
+
+'''
+Generates one table into directory, assuming the tables it depends on are there. workers=0 runs in this process.
+Returns a summary dict
+'''
+def generate_table(name, directory, workers=None, chunk_size=4096):
+    started = time.perf_counter()
+    spec = TableSpec(name)
+    size = spec.size
+    kinds = bytearray(size)
+    win_exits = bytearray(size)
+    loss_exits = bytearray(size)
+    draw_exits = bytearray(size)
+    child_counts = array('H', bytes(2 * size))
+    children = array('I')
+    # En passant nodes from all chunks, numbered from size on once collected
+    extra = (bytearray(), bytearray(), bytearray(), bytearray(), array('H'), array('I'))
+    ranges = [(start, min(start + chunk_size, size)) for start in range(0, size, chunk_size)]
+
+    def collect(chunk):
+        start, chunk_kinds, chunk_wins, chunk_losses, chunk_draws, chunk_counts, chunk_children = chunk[:7]
+        stop = start + len(chunk_kinds)
+        kinds[start:stop] = chunk_kinds
+        win_exits[start:stop] = chunk_wins
+        loss_exits[start:stop] = chunk_losses
+        draw_exits[start:stop] = chunk_draws
+        child_counts[start:stop] = chunk_counts
+        chunk_extra = chunk[7:]
+        if chunk_extra[0]:
+            base = size + len(extra[0])
+            for indexes in (chunk_children, chunk_extra[5]):
+                for i, child in enumerate(indexes):
+                    if child & VIRTUAL_CHILD:
+                        indexes[i] = base + (child ^ VIRTUAL_CHILD)
+        children.extend(chunk_children)
+        for total, part in zip(extra, chunk_extra):
+            total.extend(part)
+
+    if workers == 0:
+        for start, stop in ranges:
+            collect(generate_chunk(name, directory, start, stop))
+    else:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+            for chunk in executor.map(generate_chunk, *zip(*[(name, directory, start, stop)
+                                                              for start, stop in ranges])):
+                collect(chunk)  # in order, so children line up with child_counts
+
+    # The en passant nodes go after the table's positions, their children after the positions' children
+    for total, part in zip((kinds, win_exits, loss_exits, draw_exits, child_counts, children), extra):
+        total.extend(part)
+    values = propagate(len(kinds), kinds, win_exits, loss_exits, draw_exits, child_counts, children)[:size]
+    write_table(name, directory, values)
+    wins = losses = unreachable = 0
+    longest = 0
+    for value in values:
+        if value == ILLEGAL_VALUE:
+            unreachable += 1
+        elif value:
+            if value & 1:
+                losses += 1
+            else:
+                wins += 1
+            longest = max(longest, value - 1)
+    return {"table": name, "positions": size, "unreachable": unreachable, "wins": wins, "losses": losses,
+            "draws": size - unreachable - wins - losses, "longest_mate_plies": longest,
+            "seconds": round(time.perf_counter() - started, 3)}
+
+
+'''
+Retrograde propagation. Positions are settled in order of distance to mate: a position that is lost in d plies makes
+every position that can move into it won in d + 1, and a position whose every move leads to a won position for the
+opponent is lost once the last of them is settled. Anything left unsettled is a draw
+'''
+def propagate(size, kinds, win_exits, loss_exits, draw_exits, child_counts, children):
+    # Reverse the move graph: the positions each position can be reached from
+    starts = array('I', bytes(4 * (size + 1)))
+    for child in children:
+        starts[child + 1] += 1
+    for index in range(size):
+        starts[index + 1] += starts[index]
+    fill = array('I', starts)
+    parents = array('I', bytes(4 * len(children)))
+    position = 0
+    for parent in range(size):
+        for _ in range(child_counts[parent]):
+            child = children[position]
+            parents[fill[child]] = parent
+            fill[child] += 1
+            position += 1
+    del fill
+
+    def can_lose(index):  # no capture or promotion draws or wins
+        return not draw_exits[index] and win_exits[index] == NO_EXIT
+
+    values = bytearray(size)
+    remaining = array('H', child_counts)
+    buckets = {}
+    for index in range(size):
+        kind = kinds[index]
+        if kind == UNREACHABLE:
+            values[index] = ILLEGAL_VALUE
+        elif kind == MATED:
+            buckets.setdefault(0, []).append(index)
+        elif kind == NORMAL:
+            if win_exits[index] != NO_EXIT:
+                buckets.setdefault(win_exits[index], []).append(index)
+            if not remaining[index] and loss_exits[index] != NO_EXIT and can_lose(index):
+                buckets.setdefault(loss_exits[index], []).append(index)
+
+    plies = 0
+    while buckets:
+        settled = buckets.pop(plies, ())
+        if plies > MAX_PLIES and settled:
+            raise ValueError("Mate distance too long to store: %d plies" % plies)
+        lost = not plies & 1
+        for index in settled:
+            if values[index]:
+                continue  # settled sooner, or a win reached both ways
+            values[index] = plies + 1
+            for parent in parents[starts[index]:starts[index + 1]]:
+                if values[parent]:
+                    continue
+                if lost:
+                    buckets.setdefault(plies + 1, []).append(parent)
+                else:
+                    remaining[parent] -= 1
+                    if not remaining[parent] and can_lose(parent):
+                        exit_plies = loss_exits[parent] if loss_exits[parent] != NO_EXIT else 0
+                        buckets.setdefault(max(plies + 1, exit_plies), []).append(parent)
+        plies += 1
+    return values
+
+
+def write_table(name, directory, values):
+    header = MAGIC + bytes([VERSION, len(name) - 1, 0, 0]) + name.encode("ascii").ljust(8, b"\0")
+    path = os.path.join(directory, name + EXTENSION)
+    with open(path + ".tmp", "wb") as file:
+        file.write(header)
+        file.write(values)
+    os.replace(path + ".tmp", path)  # readers never see a half-written table
+
+
+'''
+Generates the named tables and everything they depend on, smallest first, skipping tables already in directory.
+Yields one summary per generated table
+'''
+def generate(names, directory=DEFAULT_DIRECTORY, workers=None, chunk_size=4096):
+    os.makedirs(directory, exist_ok=True)
+    order = []
+
+    def visit(name):
+        if name in order:
+            return
+        for dependency in dependencies(name):
+            visit(dependency)
+        order.append(name)
+
+    for name in names:
+        visit(table_name(*name.split("v"))[0])
+    for name in order:
+        if not os.path.exists(os.path.join(directory, name + EXTENSION)):
+            yield generate_table(name, directory, workers, chunk_size)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate endgame tablebases by retrograde analysis")
+    parser.add_argument("tables", nargs="*", help="tables such as KQvK or KRvKP (default: every 3-piece table)")
+    parser.add_argument("--pieces", type=int, choices=(3, 4), help="generate every table with this many pieces")
+    parser.add_argument("--dir", default=DEFAULT_DIRECTORY)
+    parser.add_argument("--workers", type=int, default=None, help="processes to use (0 runs in this process)")
+    parser.add_argument("--probe", help="print the tablebase result of a FEN instead of generating")
+    args = parser.parse_args(argv)
+
+    if args.probe:
+        game_state = GameState.from_fen(args.probe)
+        tablebases = Tablebases(args.dir)
+        result = tablebases.probe(game_state)
+        best = tablebases.best_move(game_state) if result is not None else None
+        json.dump({"fen": args.probe, "result": None if result is None else {WIN: "win", DRAW: "draw",
+                                                                           LOSS: "loss"}[result[0]],
+                   "plies": None if result is None else result[1],
+                   "best_move": best[0].get_chess_notation() if best else None}, sys.stdout)
+        sys.stdout.write("\n")
+        return 0
+
+    names = args.tables or all_table_names(args.pieces or 3)
+    for summary in generate(names, args.dir, args.workers):
+        json.dump(summary, sys.stdout)
+        sys.stdout.write("\n")
+        sys.stdout.flush()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
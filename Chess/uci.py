@@ -0,0 +1,226 @@
+"""
+UCI front end, so tournament runners and GUIs can drive the engine:
+
+    python -m Chess.uci
+
+Supported commands: uci, isready, ucinewgame, setoption name Hash value <MB>, setoption name BookFile value <path>
+(an opening book from Chess.book, <empty> for none), setoption name TablebasePath value <directory> (tables from
+Chess.tablebase), position startpos|fen <fen> [moves ...], go [depth N] [movetime MS] [nodes N] [wtime MS]
+[btime MS] [winc MS] [binc MS] [movestogo N] [infinite], stop, quit.
+The search runs in a background thread, so "stop" (or "quit") is answered while the engine is thinking. Bad option
+values and FENs are reported with "info string" and leave the previous setting or position in place.
+Nothing here imports pygame.
+"""
+import sys
+import threading
+
+from Chess.ChessEngine import GameState
+from Chess.ai import SearchWorker
+from Chess.book import OpeningBook
+from Chess.tablebase import Tablebases
+from Chess.search import TranspositionTable, MATE_SCORE, MATE_BOUND, MAX_DEPTH
+
+ENGINE_NAME = "Chess"
+ENGINE_AUTHOR = "Chidhanand"
+DEFAULT_HASH_MB = 16
+TABLE_ENTRY_BYTES = 120  # rough size of one transposition table slot with its tuple
+
+
+def table_for_hash(megabytes):
+    return TranspositionTable(max(1, megabytes) * 1024 * 1024 // TABLE_ENTRY_BYTES)
+
+
+'''
+Picks a time for this move from the clock: an even share of the remaining time plus most of the increment
+'''
+def allot_time(remaining_ms, increment_ms=0, moves_to_go=None):
+    share = remaining_ms / (moves_to_go or 30) + increment_ms * 0.8
+    return max(0.01, min(share, remaining_ms / 2) / 1000)
+
+
+def format_score(score):
+    if abs(score) > MATE_BOUND:
+        moves = (MATE_SCORE - abs(score) + 1) // 2
+        return "mate %d" % (moves if score > 0 else -moves)
+    return "cp %d" % score
+
+
+class UCIEngine:
+    def __init__(self, output=sys.stdout):
+        self.output = output
+        self.output_lock = threading.Lock()
+        self.game_state = GameState()
+        self.table = table_for_hash(DEFAULT_HASH_MB)
+        self.book = None
+        self.tablebases = None
+        self.worker = self.new_worker()
+        self.infinite = False
+        self.pending_result = None  # an infinite search that finished before "stop"
+
+    def new_worker(self):
+        return SearchWorker(on_iteration=self.send_info, on_finish=self.search_finished, table=self.table,
+                            book=self.book, tablebases=self.tablebases)
+
+    def send(self, line):
+        with self.output_lock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    def send_info(self, result):
+        milliseconds = int(result.seconds * 1000)
+        nps = int(result.nodes * 1000 / milliseconds) if milliseconds > 0 else result.nps
+        self.send("info depth %d score %s nodes %d nps %d time %d hashfull %d pv %s" % (
+            result.depth, format_score(result.score), result.nodes, nps, milliseconds, self.table.hashfull(),
+            " ".join(move.get_chess_notation() for move in result.pv)))
+
+    def search_finished(self, result):
+        if self.infinite and not self.worker.searcher.stopped:
+            self.pending_result = result  # "go infinite" must not answer before "stop"
+            return
+        self.send_bestmove(result)
+
+    def send_bestmove(self, result):
+        if result.best_move is None:
+            self.send("bestmove 0000")
+        elif len(result.pv) > 1:
+            self.send("bestmove %s ponder %s" % (result.best_move.get_chess_notation(),
+                                                 result.pv[1].get_chess_notation()))
+        else:
+            self.send("bestmove " + result.best_move.get_chess_notation())
+
+    '''
+    Handles one line of input. Returns False on "quit"
+    '''
+    def handle(self, line):
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, arguments = tokens[0], tokens[1:]
+        if command == "uci":
+            self.send("id name " + ENGINE_NAME)
+            self.send("id author " + ENGINE_AUTHOR)
+            self.send("option name Hash type spin default %d min 1 max 1024" % DEFAULT_HASH_MB)
+            self.send("option name BookFile type string default <empty>")
+            self.send("option name TablebasePath type string default <empty>")
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "ucinewgame":
+            self.stop()
+            self.table.clear()
+            self.game_state = GameState()
+        elif command == "setoption":
+            self.set_option(arguments)
+        elif command == "position":
+            self.stop()
+            self.set_position(arguments)
+        elif command == "go":
+            self.go(arguments)
+        elif command == "stop":
+            self.stop()
+        elif command == "quit":
+            self.stop()
+            return False
+        return True
+
+    def set_option(self, arguments):
+        if "value" not in arguments:
+            return
+        split = arguments.index("value")
+        name = " ".join(arguments[1:split]) if arguments[:1] == ["name"] else ""
+        if name.lower() == "hash":
+            try:
+                megabytes = int(arguments[split + 1])
+            except (ValueError, IndexError):
+                self.send("info string bad Hash value: " + " ".join(arguments[split + 1:]))
+                return
+            self.stop()
+            self.table = table_for_hash(megabytes)
+            self.worker = self.new_worker()
+        elif name.lower() == "bookfile":
+            self.stop()
+            if self.book is not None:
+                self.book.close()
+            path = " ".join(arguments[split + 1:])
+            try:
+                self.book = OpeningBook(path) if path and path != "<empty>" else None
+            except (OSError, ValueError) as error:
+                self.book = None
+                self.send("info string cannot open book: %s" % error)
+            self.worker = self.new_worker()
+        elif name.lower() == "tablebasepath":
+            self.stop()
+            if self.tablebases is not None:
+                self.tablebases.close()
+            path = " ".join(arguments[split + 1:])
+            self.tablebases = Tablebases(path) if path and path != "<empty>" else None
+            if self.tablebases is not None and not self.tablebases.available:
+                self.send("info string no tablebases in " + path)
+            self.worker = self.new_worker()
+
+    '''
+    A bad FEN is reported and the previous position kept; moves are applied up to the first illegal one
+    '''
+    def set_position(self, arguments):
+        if arguments[:1] == ["fen"]:
+            end = arguments.index("moves") if "moves" in arguments else len(arguments)
+            try:
+                game_state = GameState.from_fen(" ".join(arguments[1:end]))
+            except (ValueError, KeyError) as error:
+                self.send("info string bad fen: %s" % error)
+                return
+        else:
+            end = 1
+            game_state = GameState()
+        for text in arguments[end + 1:]:
+            for move in game_state.get_valid_moves() or []:
+                if move.get_chess_notation() == text:
+                    game_state.apply_move(move)
+                    break
+            else:
+                self.send("info string illegal move " + text)
+                break
+        self.game_state = game_state
+
+    def go(self, arguments):
+        self.stop()
+        options = {}
+        for i, token in enumerate(arguments):
+            if i + 1 < len(arguments) and arguments[i + 1].lstrip('-').isdigit():
+                try:
+                    options[token] = int(arguments[i + 1])
+                except ValueError:  # digits int() doesn't read, such as superscripts
+                    self.send("info string bad %s value: %s" % (token, arguments[i + 1]))
+        self.infinite = "infinite" in arguments or "ponder" in arguments
+        self.pending_result = None
+
+        time_limit = None
+        if "movetime" in options:
+            time_limit = options["movetime"] / 1000
+        elif not self.infinite:
+            side = "w" if self.game_state.White_To_Move else "b"
+            if side + "time" in options:
+                time_limit = allot_time(options[side + "time"], options.get(side + "inc", 0),
+                                        options.get("movestogo"))
+        self.worker.start(self.game_state, time_limit, options.get("depth", MAX_DEPTH), options.get("nodes"))
+
+    def stop(self):
+        if self.worker.is_running():
+            self.worker.stop()
+        if self.pending_result is not None:
+            result, self.pending_result = self.pending_result, None
+            self.send_bestmove(result)
+        self.infinite = False
+
+
+def main(input_stream=sys.stdin, output=sys.stdout):
+    engine = UCIEngine(output)
+    for line in input_stream:
+        if not engine.handle(line):
+            break
+    engine.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
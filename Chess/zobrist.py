@@ -0,0 +1,34 @@
+"""
+Zobrist hashing: a position's 64-bit key is the XOR of one random number per (piece, square), plus numbers for the
+side to move, the castling rights and the en passant file. A move only changes a handful of those terms, so
+GameState keeps its zobrist_key up to date in O(1) per move; compute_key rebuilds it from scratch for verification.
+
+The tables are indexed by the mailbox piece codes and mailbox square indices used in ChessEngine, and are generated
+from a fixed seed so keys are stable between runs and processes.
+"""
+import random
+
+_random = random.Random(0x5EED)
+
+
+def _random_key():
+    return _random.getrandbits(64)
+
+
+PIECE_KEYS = [[_random_key() for _ in range(120)] for _ in range(33)]  # [piece code][mailbox square]
+SIDE_KEY = _random_key()  # XORed in when black is to move
+CASTLE_KEYS = [_random_key() for _ in range(16)]  # one per castling rights bitmask
+ENPASSANT_KEYS = [_random_key() for _ in range(8)]  # by column of the en passant square
+
+
+def compute_key(mailbox, white_to_move, castle_rights, enpassant):
+    key = CASTLE_KEYS[castle_rights]
+    for sq in range(len(mailbox)):
+        piece = mailbox[sq]
+        if 0 < piece < 32:
+            key ^= PIECE_KEYS[piece][sq]
+    if not white_to_move:
+        key ^= SIDE_KEY
+    if enpassant:
+        key ^= ENPASSANT_KEYS[enpassant[1]]
+    return key